@@ -9,57 +9,165 @@ np.import_array()
 
 # Wrapping kepler(M,e) a simple function that takes two doubles as
 # arguments and returns a double
-cdef extern from "kepler.c":
+# (these are pure C functions, so they can be called without the GIL)
+cdef extern from "kepler.c" nogil:
     double kepler(double M, double e)
     double rv_curve(double t, double per, double tp, double e, double om, double k )
 
 DTYPE = np.float64
 ctypedef np.float64_t DTYPE_t
 
-# create the wrapper code, with numpy type annotations
+# create the wrapper code, with typed memoryviews
+# the loops release the GIL, so they can run concurrently from threads
 @cython.boundscheck(False)
-def kepler_array(double [:,] M, double e):
-    cdef int size, i
-
+@cython.wraparound(False)
+def kepler_array(const double[::1] M, double e):
+    cdef Py_ssize_t size, i
     size = M.shape[0]
-    cdef np.ndarray[double, ndim=1] E = \
-        np.ndarray(shape=(size,), dtype=np.float64) 
 
-    for i in range(size):
-        E[i] = kepler(M[i], e)
+    E = np.empty(size, dtype=DTYPE)
+    cdef double[::1] E_view = E
+
+    with nogil:
+        for i in range(size):
+            E_view[i] = kepler(M[i], e)
+
+    return E
 
-    return E 
 
-# create the wrapper code, with numpy type annotations
 @cython.boundscheck(False)
-def rv_curve_array(np.ndarray[DTYPE_t, ndim=1] t, double per, double tp, 
+@cython.wraparound(False)
+def rv_curve_array(const double[::1] t, double per, double tp,
                    double e, double om, double k):
-    cdef int size, i 
+    cdef Py_ssize_t size, i
     size = t.shape[0]
 
-    cdef np.ndarray[DTYPE_t, ndim=1] rv = t.copy()
-    for i in range(size):
-        rv[i] = rv_curve(t[i], per, tp, e, om, k)
+    rv = np.empty(size, dtype=DTYPE)
+    cdef double[::1] rv_view = rv
+
+    with nogil:
+        for i in range(size):
+            rv_view[i] = rv_curve(t[i], per, tp, e, om, k)
 
     return rv
 
 
-# create the wrapper code, with numpy type annotations
 @cython.boundscheck(False)
-def rv_curve_multi_array(np.ndarray[DTYPE_t, ndim=1] t, 
-                         np.ndarray[DTYPE_t, ndim=1] per,
-                         np.ndarray[DTYPE_t, ndim=1] tp,
-                         np.ndarray[DTYPE_t, ndim=1] e, 
-                         np.ndarray[DTYPE_t, ndim=1] om, 
-                         np.ndarray[DTYPE_t, ndim=1] k):
-    cdef int size, npl, j, i 
+@cython.wraparound(False)
+def rv_curve_multi_array(const double[::1] t,
+                         const double[::1] per,
+                         const double[::1] tp,
+                         const double[::1] e,
+                         const double[::1] om,
+                         const double[::1] k):
+    cdef Py_ssize_t size, npl, j, i
     size = t.shape[0]
     npl = per.shape[0]
 
-    # cdef np.ndarray[DTYPE_t, ndim=1] rv = t.copy()
-    cdef np.ndarray rv = np.zeros([size, npl], dtype=DTYPE)
-    for j in range(npl):
+    rv = np.empty((size, npl), dtype=DTYPE)
+    cdef double[:, ::1] rv_view = rv
+
+    with nogil:
         for i in range(size):
-            rv[i, j] += rv_curve(t[i], per[j], tp[j], e[j], om[j], k[j])
+            for j in range(npl):
+                rv_view[i, j] = rv_curve(t[i], per[j], tp[j], e[j], om[j], k[j])
+
+    return rv
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def rv_curve_sum_array(const double[::1] t,
+                       const double[::1] per,
+                       const double[::1] tp,
+                       const double[::1] e,
+                       const double[::1] om,
+                       const double[::1] k,
+                       double[::1] out):
+    # the sum of the RV curves of all orbits, accumulated in a single pass
+    cdef Py_ssize_t size, npl, j, i
+    cdef double s
+    size = t.shape[0]
+    npl = per.shape[0]
+
+    with nogil:
+        for i in range(size):
+            s = 0.0
+            for j in range(npl):
+                s = s + rv_curve(t[i], per[j], tp[j], e[j], om[j], k[j])
+            out[i] = s
+
+    return out
+
+
+# recursions of the celerite factorisation and sampling (see sam/_celerite.py)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def celerite_factor(const double[:, ::1] U, const double[:, ::1] P,
+                    double[::1] D, double[:, ::1] W, double tol):
+    # K = L D L^T, overwriting D and W; pivots within `tol` of zero are set 
+    # to zero. Returns False if the matrix is not positive semi-definite
+    cdef Py_ssize_t N, J, n, i, j
+    cdef double d, us
+    N, J = U.shape[0], U.shape[1]
+    S = np.zeros((J, J), dtype=DTYPE)
+    US = np.empty(J, dtype=DTYPE)
+    cdef double[:, ::1] S_view = S
+    cdef double[::1] US_view = US
+    cdef bint ok = True
+
+    with nogil:
+        for n in range(1, N):
+            d = D[n-1]
+            for i in range(J):
+                for j in range(J):
+                    S_view[i, j] = P[n-1, i] * P[n-1, j] * \
+                        (S_view[i, j] + d * W[n-1, i] * W[n-1, j])
+            d = D[n]
+            for j in range(J):
+                us = 0.0
+                for i in range(J):
+                    us = us + U[n, i] * S_view[i, j]
+                US_view[j] = us
+                d = d - us * U[n, j]
+            if d <= tol:
+                if d < -tol:
+                    ok = False
+                    break
+                D[n] = 0.0
+                for j in range(J):
+                    W[n, j] = 0.0
+                continue
+            D[n] = d
+            for j in range(J):
+                W[n, j] = (W[n, j] - US_view[j]) / d
+
+    return ok
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def celerite_sample(const double[:, ::1] U, const double[:, ::1] P,
+                    const double[:, ::1] W, const double[:, ::1] z,
+                    double[:, ::1] y):
+    # y = L z (z already scaled by sqrt(D)), for all the columns of z
+    cdef Py_ssize_t N, J, M, n, j, m
+    cdef double f
+    N, J, M = U.shape[0], U.shape[1], z.shape[1]
+    F = np.zeros((J, M), dtype=DTYPE)
+    cdef double[:, ::1] F_view = F
+
+    with nogil:
+        for m in range(M):
+            y[0, m] = z[0, m]
+        for n in range(1, N):
+            for m in range(M):
+                y[n, m] = z[n, m]
+            for j in range(J):
+                for m in range(M):
+                    f = P[n-1, j] * (F_view[j, m] + W[n-1, j] * z[n-1, m])
+                    F_view[j, m] = f
+                    y[n, m] = y[n, m] + U[n, j] * f
 
-    return rv
\ No newline at end of file
+    return y
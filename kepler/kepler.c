@@ -2,7 +2,7 @@
 #include <math.h>
 #include <stdlib.h>
 
-int sign(int x) {
+static double sign(double x) {
   return (x > 0) - (x < 0);
 }
 
@@ -76,6 +76,7 @@ double rv_curve(double t, double per, double tp, double e, double om, double k)
   return rv;
 }
 
+#ifdef KEPLER_MAIN
 // little test function 
 int main()
 {
@@ -88,3 +89,4 @@ int main()
   printf("%lf\n",E);
   return 0;
 }
+#endif
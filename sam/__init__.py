@@ -2,11 +2,13 @@
 SAM: the Stellar Activity Machine
 """
 
-__all__ = ['Planet', 'Earth', 'Jupiter', 
+__all__ = ['Planet', 'Earth', 'Jupiter', 'PlanetarySystem',
            'Granulation',
            'Offset', 'Slope',
            'WhiteNoise', 'DistributedNoise', 
            'TimeSampling', 'SOAP',
+           'InjectionRecovery', 'GLSPeriodogram', 'SimulationStore',
+           'ScheduleCatalog', 'FisherForecast',
           ]
 
 
@@ -16,12 +18,18 @@ from astropy import constants
 units.ms = units.meter / units.second
 units.kms = units.kilometer / units.second
 
-from ._planet import Planet, Earth, Jupiter, \
+from ._planet import Planet, Earth, Jupiter, PlanetarySystem, \
                      Offset, Slope
 from ._granulation import Granulation
 from ._oscillations import Oscillation
 from ._noise import WhiteNoise, DistributedNoise
 from ._sampling import TimeSampling
+from ._catalog import ScheduleCatalog
 
 from ._soap import SOAP
 
+from ._injection import InjectionRecovery
+from ._detection import GLSPeriodogram
+from ._store import SimulationStore
+from ._forecast import FisherForecast
+
@@ -0,0 +1,147 @@
+import os
+import json
+import pickle
+import fnmatch
+import numpy as np
+
+from ._sampling import TimeSampling
+from .kepler import _cache_dir
+
+__all__ = ['ScheduleCatalog']
+
+# the observing epochs of the LCE sample, shipped with SAM
+lce_pickle = os.path.join(os.path.dirname(__file__), 'data',
+                          'LCEStimes.pickle')
+
+
+class ScheduleCatalog(object):
+    """
+    A library of real observing schedules, stored in the directory `path` as
+    one flat array with the times of all schedules (`times.npy`, opened as a
+    memory map), the offsets where each schedule starts (`offsets.npy`) and
+    an index with the target and instrument of each schedule (`index.json`).
+
+    Only the offsets and the index are read when the catalog is opened; the
+    times of a schedule are read from disk when it is selected. Create a
+    catalog with `ScheduleCatalog.build`, or get the bundled LCE schedules
+    with `ScheduleCatalog.lce()`.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        self.targets = np.array(index['targets'])
+        self.instruments = np.array(index['instruments'])
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self._times = None
+
+    def __repr__(self):
+        return "ScheduleCatalog(%s, %d schedules)" % (self.path, len(self))
+
+    def __len__(self):
+        return self.offsets.size - 1
+
+    @property
+    def times(self):
+        """ The (memory-mapped) times of all schedules, one after the other """
+        if self._times is None:
+            self._times = np.load(os.path.join(self.path, 'times.npy'),
+                                  mmap_mode='r')
+        return self._times
+
+    @property
+    def nobs(self):
+        return np.diff(self.offsets)
+
+    @staticmethod
+    def build(path, schedules, targets=None, instruments=None):
+        """
+        Write the catalog of `schedules` (a sequence of arrays of times) to
+        `path` and return it. `targets` and `instruments` are sequences of
+        names for each schedule (by default, '0', '1', ... and '').
+        """
+        schedules = [np.asarray(s, dtype=float).ravel() for s in schedules]
+        n = len(schedules)
+        if targets is None:
+            targets = [str(i) for i in range(n)]
+        if instruments is None:
+            instruments = [''] * n
+        if not len(targets) == len(instruments) == n:
+            raise ValueError('need one target and instrument per schedule')
+
+        os.makedirs(path, exist_ok=True)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([s.size for s in schedules], out=offsets[1:])
+        np.save(os.path.join(path, 'times.npy'), np.concatenate(schedules))
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        # the index is written last, so that a partial catalog can't be opened
+        tmp = os.path.join(path, 'index.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'targets': list(map(str, targets)),
+                       'instruments': list(map(str, instruments))}, f)
+        os.replace(tmp, os.path.join(path, 'index.json'))
+        return ScheduleCatalog(path)
+
+    @staticmethod
+    def _load_pickle(filename):
+        with open(filename, 'rb') as f:
+            return pickle.load(f, encoding='latin1')
+
+    @classmethod
+    def from_pickle(cls, filename, path, **kwargs):
+        """ Convert a pickled sequence of arrays of times into a catalog """
+        return cls.build(path, cls._load_pickle(filename), **kwargs)
+
+    @classmethod
+    def lce(cls, path=None):
+        """
+        The observing schedules of the LCE sample, shipped with SAM. They are
+        converted to a catalog in the cache directory the first time.
+        """
+        if path is None:
+            path = os.path.join(_cache_dir(), 'lce_schedules')
+        if os.path.exists(os.path.join(path, 'index.json')):
+            return cls(path)
+        schedules = cls._load_pickle(lce_pickle)
+        return cls.build(path, schedules,
+                         targets=['LCE%04d' % i for i in range(len(schedules))])
+
+    def _position(self, key):
+        if isinstance(key, str):
+            found = np.flatnonzero(self.targets == key)
+            if found.size == 0:
+                raise KeyError('no schedule for target "%s"' % key)
+            return found[0]
+        if not -len(self) <= key < len(self):
+            raise IndexError('schedule %d out of range' % key)
+        return key % len(self)
+
+    def get_times(self, key):
+        """ The times of schedule `key` (a position or a target name) """
+        i = self._position(key)
+        return self.times[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, key):
+        return TimeSampling(np.array(self.get_times(key)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, target=None, instrument=None, min_nobs=None,
+               max_nobs=None):
+        """
+        Positions of the schedules matching all the given criteria. `target`
+        and `instrument` can be shell-style patterns (e.g. 'HD*').
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for names, pattern in ((self.targets, target),
+                               (self.instruments, instrument)):
+            if pattern is not None:
+                mask &= np.array([fnmatch.fnmatchcase(name, pattern)
+                                  for name in names], dtype=bool)
+        if min_nobs is not None:
+            mask &= self.nobs >= min_nobs
+        if max_nobs is not None:
+            mask &= self.nobs <= max_nobs
+        return np.flatnonzero(mask)
@@ -0,0 +1,114 @@
+import numpy as np
+
+from .utils import LRUCache, array_key
+from .kepler import cext
+if cext:
+    from . import _kepler
+
+__all__ = ['kernel', 'factor', 'sample']
+
+# Gaussian processes with celerite kernels (Foreman-Mackey et al. 2017),
+#   k(tau) = sum_j exp(-c_j |tau|) [a_j cos(d_j tau) + b_j sin(d_j |tau|)]
+# for which the covariance matrix at any (irregular) times is semiseparable,
+# so that it can be factorised and sampled from in O(N). A set of terms is
+# an array with one row (a, b, c, d) per term; real terms have b = d = 0.
+# The recursions follow the celerite2 formulation, and run in the C
+# extension (sam._kepler) when it is available.
+
+
+def kernel(tau, terms):
+    """ The covariance at lags `tau` """
+    tau = np.abs(np.asarray(tau, dtype=float))[..., np.newaxis]
+    a, b, c, d = np.asarray(terms, dtype=float).T
+    return (np.exp(-c * tau) * (a * np.cos(d * tau) +
+                                b * np.sin(d * tau))).sum(axis=-1)
+
+
+def _matrices(t, terms, diag=0.):
+    a, b, c, d = np.asarray(terms, dtype=float).T
+    cos, sin = np.cos(d * t[:, np.newaxis]), np.sin(d * t[:, np.newaxis])
+    U = np.concatenate([a * cos + b * sin, a * sin - b * cos], axis=1)
+    V = np.concatenate([cos, sin], axis=1)
+    P = np.exp(-np.concatenate([c, c]) * np.diff(t)[:, np.newaxis])
+    return a.sum() + diag, U, V, P
+
+
+# relative size of the roundoff errors tolerated in the pivots D
+tolerance = 1e-10
+
+
+def _factor(t, terms, diag=0.):
+    D, U, W, P = _matrices(t, terms, diag)
+    D = np.full(t.size, D, dtype=float) if np.ndim(D) == 0 else D.copy()
+    tol = tolerance * D.max()
+    W[0] /= D[0]
+    if cext:
+        # the same recursion, in C
+        if not _kepler.celerite_factor(U, P, D, W, tol):
+            raise np.linalg.LinAlgError('covariance is not positive '
+                                        'semi-definite')
+        return U, P, D, W
+
+    J = U.shape[1]
+    S = np.zeros((J, J))
+    for n in range(1, t.size):
+        S = P[n-1][:, np.newaxis] * \
+            (S + D[n-1] * np.outer(W[n-1], W[n-1])) * P[n-1]
+        D[n] -= U[n] @ S @ U[n]
+        if D[n] <= tol:
+            if D[n] < -tol:
+                raise np.linalg.LinAlgError('covariance is not positive '
+                                            'semi-definite')
+            # singular (e.g. repeated times): the value at t[n] is fully
+            # determined by the previous ones
+            D[n], W[n] = 0., 0.
+            continue
+        W[n] = (W[n] - U[n] @ S) / D[n]
+    return U, P, D, W
+
+
+# factorisations are reused for the same times and terms
+_factors = LRUCache(maxsize=8)
+
+def factor(t, terms, diag=0.):
+    """
+    The factorisation K = L D L^T of the covariance matrix at times `t`
+    (sorted), plus `diag` on the diagonal, with L = I + tril(U W^T). Pivots
+    D within roundoff of zero (e.g. at repeated times) are set to zero.
+    """
+    t = np.asarray(t, dtype=float)
+    terms = np.asarray(terms, dtype=float)
+    key = (array_key(t), array_key(terms), array_key(np.asarray(diag, float)))
+    factors = _factors.get(key)
+    if factors is None:
+        factors = _factors[key] = _factor(t, terms, diag)
+    return factors
+
+
+def sample(t, terms, size=None, rng=None):
+    """
+    Exact samples of the Gaussian process at times `t`, `size` realizations
+    as the rows of a 2-D array (or one if `size` is None), as L sqrt(D) z
+    for standard normal z drawn from the numpy.random.Generator `rng`
+    """
+    if rng is None:
+        rng = np.random
+    t = np.asarray(t, dtype=float)
+    order = np.argsort(t, kind='stable')
+    U, P, D, W = factor(t[order], terms)
+
+    z = rng.normal(0, 1, (t.size, 1 if size is None else size))
+    z *= np.sqrt(D)[:, np.newaxis]
+    if cext:
+        y = np.empty_like(z)
+        _kepler.celerite_sample(U, P, W, z, y)
+    else:
+        y = z.copy()
+        F = np.zeros((U.shape[1], z.shape[1]))
+        for n in range(1, t.size):
+            F = P[n-1][:, np.newaxis] * (F + np.outer(W[n-1], z[n-1]))
+            y[n] += U[n] @ F
+
+    out = np.empty_like(y)
+    out[order] = y
+    return out[:, 0] if size is None else out.T
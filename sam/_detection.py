@@ -0,0 +1,135 @@
+import numpy as np
+
+from ._sampling import TimeSampling
+from .utils import LombScargle, LRUCache, array_key, cache_maxbytes
+
+__all__ = ['GLSPeriodogram', 'periodogram_detection']
+
+
+class GLSPeriodogram(object):
+    """
+    Generalised Lomb-Scargle periodograms (Zechmeister & Kürster 2009) of
+    many datasets sharing the same times `t` and uncertainties `err`.
+
+    The trigonometric basis and all the sums which only depend on the times
+    are computed once for the frequency grid `freq` (by default, astropy's
+    autofrequency for `t`), so the periodograms of a batch of datasets are
+    obtained with two matrix products. Frequencies are processed in blocks
+    of `block_size`. The (co)sine terms of the first blocks are kept, up to
+    `max_bytes` (by default utils.cache_maxbytes), and those of the others
+    are recomputed in each call to `power`, so memory stays bounded.
+    """
+    def __init__(self, t, freq=None, err=None, block_size=2048,
+                 max_bytes=cache_maxbytes, **kwargs):
+        if isinstance(t, TimeSampling):
+            t = t.get_times()
+        self.t = np.asarray(t, dtype=float)
+        if freq is None:
+            freq = LombScargle(self.t, np.zeros_like(self.t)).autofrequency(
+                **kwargs)
+        self.freq = np.asarray(freq, dtype=float)
+        self.block_size = block_size
+
+        if err is None:
+            w = np.ones_like(self.t)
+        else:
+            w = 1 / np.asarray(err, dtype=float)**2
+        self.w = w / w.sum()
+
+        # weighted sums of the (co)sine terms, per frequency block, and the
+        # weighted terms themselves while they fit in max_bytes
+        self._blocks, self._trig = [], []
+        self.nbytes = 0
+        for start in range(0, self.freq.size, block_size):
+            cos, sin = self._basis(start)
+            w = self.w[:, np.newaxis]
+            wcos, wsin = w * cos, w * sin
+            C, S = wcos.sum(axis=0), wsin.sum(axis=0)
+            CC = (wcos * cos).sum(axis=0) - C * C
+            SS = 1 - C * C - CC - S * S  # uses sum(w cos²) + sum(w sin²) = 1
+            CS = (wcos * sin).sum(axis=0) - C * S
+            D = CC * SS - CS * CS
+            # only the terms of the first blocks are kept
+            keep = len(self._trig) == len(self._blocks) and \
+                self.nbytes + wcos.nbytes + wsin.nbytes <= max_bytes
+            self._blocks.append((C, S, CC, SS, CS, D))
+            if keep:
+                self._trig.append((wcos, wsin))
+                self.nbytes += wcos.nbytes + wsin.nbytes
+
+    def _basis(self, start):
+        """ (co)sine terms for the block of frequencies from `start` """
+        f = self.freq[start:start + self.block_size]
+        arg = 2 * np.pi * self.t[:, np.newaxis] * f
+        return np.cos(arg), np.sin(arg)
+
+    def __repr__(self):
+        return "GLSPeriodogram(%d times, %d frequencies)" % \
+            (self.t.size, self.freq.size)
+
+    def power(self, y):
+        """
+        Normalised GLS power (between 0 and 1) of each row of `y`, with
+        shape (n_datasets, n_times). Returns an array of shape
+        (n_datasets, n_frequencies).
+        """
+        y = np.atleast_2d(y)
+        Y = y @ self.w
+        YY = (y * y) @ self.w - Y * Y
+
+        power = np.empty((y.shape[0], self.freq.size))
+        w = self.w[:, np.newaxis]
+        for i, (C, S, CC, SS, CS, D) in enumerate(self._blocks):
+            start = i * self.block_size
+            if i < len(self._trig):
+                wcos, wsin = self._trig[i]
+            else:
+                cos, sin = self._basis(start)
+                wcos, wsin = w * cos, w * sin
+            YC = y @ wcos - np.outer(Y, C)
+            YS = y @ wsin - np.outer(Y, S)
+            p = (SS * YC * YC + CC * YS * YS - 2 * CS * YC * YS) / D
+            power[:, start:start + C.size] = p / YY[:, np.newaxis]
+        return power
+
+    def false_alarm_probability(self, power):
+        """
+        Analytical false alarm probability of a peak with normalised
+        `power`, for N independent frequencies estimated as T * (fmax - fmin)
+        (Zechmeister & Kürster 2009, Eqs. 24 and 25)
+        """
+        N = self.t.size
+        prob = (1 - np.asarray(power)) ** ((N - 3) / 2)
+        M = max(np.ptp(self.t) * np.ptp(self.freq), 1)
+        return 1 - (1 - prob) ** M
+
+    def peaks(self, y):
+        """ Frequency, power and false alarm probability of the highest
+        peak in the periodogram of each row of `y` """
+        power = self.power(y)
+        best = power.argmax(axis=1)
+        peak_power = power[np.arange(power.shape[0]), best]
+        return {'frequency': self.freq[best], 'power': peak_power,
+                'fap': self.false_alarm_probability(peak_power)}
+
+
+# periodograms are reused for datasets with the same times
+_periodograms = LRUCache(maxsize=4, maxbytes=cache_maxbytes)
+
+def periodogram_detection(t, y, P, fap_threshold=0.01, tolerance=0.05):
+    """
+    Detection criterion: the highest peak of the GLS periodogram of each row
+    of `y` has a false alarm probability below `fap_threshold` and is within
+    a fractional `tolerance` of the injected period `P` (one for each row).
+    """
+    key = array_key(t)
+    periodogram = _periodograms.get(key)
+    if periodogram is None:
+        periodogram = _periodograms[key] = GLSPeriodogram(t)
+
+    peaks = periodogram.peaks(y)
+    period = 1 / peaks['frequency']
+    detected = (peaks['fap'] < fap_threshold) & \
+               (np.abs(period / P - 1) < tolerance)
+    return {'period': period, 'power': peaks['power'], 'fap': peaks['fap'],
+            'detected': detected}
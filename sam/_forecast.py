@@ -0,0 +1,89 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+
+from . import kepler
+from ._sampling import TimeSampling
+from ._planet import grid_block_elements
+
+__all__ = ['FisherForecast']
+
+parameter_names = ('P', 'K', 'e', 'omega', 'Tp')
+
+
+class FisherForecast(object):
+    """
+    Fisher-matrix forecasts of the detectability of planets observed at the
+    times of `sampling` (a TimeSampling or an array), in the presence of
+    `noise`: a component or a Model (e.g. WhiteNoise + Granulation). The 
+    Cholesky factor L of the noise covariance comes from `noise.cholesky`,
+    which caches it (also on disk, with `disk_cache`).
+
+    For the orbits of a Planet (or a grid of them), the RV curves and their
+    analytic derivatives are whitened with one triangular solve with L, and
+    the SNR and Fisher matrices of all orbits follow from matrix products.
+    """
+    def __init__(self, noise, sampling, disk_cache=False):
+        if isinstance(sampling, TimeSampling):
+            sampling = sampling.get_times()
+        self.t = np.asarray(sampling, dtype=float)
+        self.noise = noise
+        self.L = noise.cholesky(self.t, disk_cache)
+
+    def __repr__(self):
+        return "FisherForecast(%d times)" % self.t.size
+
+    @property
+    def covariance(self):
+        return self.noise.covariance_matrix(self.t)
+
+    def _whiten(self, x):
+        return solve_triangular(self.L, x, lower=True, check_finite=False)
+
+    def forecast(self, planet, parameters=parameter_names, block_size=None):
+        """
+        Expected SNR of the signal of each orbit of `planet` and forecast
+        uncertainties (square root of the diagonal of the inverse Fisher
+        matrix) for the given `parameters`, a subset of parameter_names.
+        Degenerate Fisher matrices (e.g. omega and Tp of circular orbits)
+        are inverted with a pseudo-inverse. Orbits are processed in blocks
+        of `block_size`. Returns a dict with 'snr', with the shape of the
+        planet grid, and 'sigma', with an extra last axis for `parameters`.
+        """
+        index = [parameter_names.index(p) for p in parameters]
+        n, p = self.t.size, len(index)
+        size = planet.gridsize
+        if block_size is None:
+            block_size = max(1, grid_block_elements // (n * (p + 1)))
+
+        snr, sigma = np.empty(size), np.empty((size, p))
+        for start in range(0, size, block_size):
+            stop = min(start + block_size, size)
+            batch = kepler.OrbitBatch(*planet.orbit_block(start, stop))
+            rv, jac = kepler.rv_curve_jacobian(self.t, batch)
+            g = stop - start
+
+            # one triangular solve for the curves and all their derivatives
+            white = self._whiten(np.concatenate(
+                [rv, jac[..., index].reshape(n, g * p)], axis=1))
+            white_rv = white[:, :g]
+            white_jac = white[:, g:].reshape(n, g, p)
+
+            snr[start:stop] = np.sqrt(np.einsum('tg,tg->g', white_rv, white_rv))
+            fisher = np.einsum('tgi,tgj->gij', white_jac, white_jac)
+            cov = np.linalg.pinv(fisher, hermitian=True)
+            sigma[start:stop] = np.sqrt(np.abs(np.diagonal(cov, axis1=1,
+                                                           axis2=2)))
+
+        shape = planet._grid_shape() if planet.grid else ()
+        return {'snr': snr.reshape(shape), 'sigma': sigma.reshape(shape + (p, )),
+                'parameters': tuple(parameters)}
+
+    def detection_limit(self, planet, snr=7., block_size=None):
+        """
+        The semi-amplitude that each orbit of `planet` needs to reach a
+        signal-to-noise ratio `snr` (which is proportional to K)
+        """
+        forecast = self.forecast(planet, ('K', ), block_size)
+        K = planet.orbit_block()[1]
+        K = K.reshape(forecast['snr'].shape)
+        return K * snr / forecast['snr']
@@ -1,32 +1,33 @@
 import numpy as np
-import numpy.random as rng
-from .components import Component
+from .components import StochasticComponent
 from . import units, constants
-from .utils import timeseries_from_power_spectrum, normalise_timeseries, \
-                   _pprint, _pprints
-
-from astropy.stats import LombScargle
+from .utils import _pprint, _pprints, autocovariance_from_psd
+from . import _celerite
 
 __all__ = ['Granulation',]
 
 sigma_units = (units.ms**2/units.uHz)
 tau_units = units.hour
 
-class Granulation(Component):
-    
-    def __init__(self, sigma=0.01, tau=2, model='', C=None):
-        try:
-            assert sigma.unit == sigma_units, \
-                'Units of `sigma` in Granulation should be %s' % sigma_units
-        except AttributeError:
-            sigma = sigma * sigma_units
-
-        try:
-            assert tau.unit == tau_units, \
-                'Units of `tau` in Granulation should be %s' % tau_units
-        except AttributeError:
-            tau = tau * tau_units
-
+# internally, PSDs are evaluated on plain arrays in SI units:
+# sigma in m²/s²/Hz, tau in s and frequencies in Hz
+_sigma_si = sigma_units.to(units.ms**2/units.Hz)
+_tau_si = tau_units.to(units.s)
+_exponents = {'harvey': 2, 'kallinger': 4}
+_day = units.day.to(units.s)
+
+class Granulation(StochasticComponent):
+    """
+    Granulation signal with a Harvey-like PSD, sigma / (1 + (tau nu)^C).
+    Time series are simulated with `method` 'fft', 'interpolate', 
+    'celerite' (only for the 'harvey' and 'kallinger' PSDs, which are 
+    celerite kernels) or 'cholesky' (any model); see StochasticComponent.
+    `grid_tolerance`, `grid_resolution` and `max_grid_size` set the 
+    accuracy and size of the frequency grid of method='interpolate'.
+    """
+    def __init__(self, sigma=0.01, tau=2, model='', C=None, seed=None,
+                 method='fft', grid_tolerance=1e-3, grid_resolution=None,
+                 max_grid_size=2**16):
         self.sigma, self.tau = sigma, tau
         if model.lower() not in ('harvey', 'kallinger'):
             assert C is not None, \
@@ -34,8 +35,35 @@ class Granulation(Component):
                 'please provice the exponent `C`.'
             self.C = C
         self.model = model.lower()
-
-        self.random_state = rng.get_state()
+        self._init_method(method, grid_tolerance, grid_resolution, 
+                          max_grid_size)
+        self._init_rng(seed)
+
+    @property
+    def sigma(self):
+        return self._sigma
+    @sigma.setter
+    def sigma(self, value):
+        try:
+            assert value.unit == sigma_units, \
+                'Units of `sigma` in Granulation should be %s' % sigma_units
+        except AttributeError:
+            value = value * sigma_units
+        self._sigma = value
+        self._A = value.value * _sigma_si
+
+    @property
+    def tau(self):
+        return self._tau
+    @tau.setter
+    def tau(self, value):
+        try:
+            assert value.unit == tau_units, \
+                'Units of `tau` in Granulation should be %s' % tau_units
+        except AttributeError:
+            value = value * tau_units
+        self._tau = value
+        self._B = value.value * _tau_si
 
     def __repr__(self):
         s, tau = self.sigma, self.tau
@@ -68,50 +96,50 @@ class Granulation(Component):
 
     def get_psd(self, nu):
         assert nu.unit == units.Hz
+        return self._psd(nu.to_value(units.Hz)) / _sigma_si * sigma_units
+
+    def _psd(self, nu):
+        """ The PSD in m²/s²/Hz at frequencies `nu` in Hz, without units """
+        return self._A / (1.0 + (self._B * nu) ** self._exponent())
+
+    def _exponent(self):
+        return _exponents.get(self.model, getattr(self, 'C', None))
+
+    def _variance(self):
+        """ The integral of the PSD, in m²/s² """
+        C = self._exponent()
+        return self._A / self._B * (np.pi / C) / np.sin(np.pi / C)
+
+    def _bandwidth(self, tolerance):
+        """ Frequency (in Hz) above which there is at most a fraction 
+        `tolerance` of the power (from the asymptotic tail of the PSD) """
+        C = self._exponent()
+        k = (np.pi / C) / np.sin(np.pi / C)
+        return ((C - 1) * tolerance * k) ** (-1 / (C - 1)) / self._B
+
+    def _psd_key(self):
+        return (self.model, self._A, self._B, getattr(self, 'C', None))
+
+    def celerite_terms(self):
+        """ 
+        The (a, b, c, d) celerite terms with this PSD, in (m/s)² and 1/day.
+        A Harvey PSD is an exponential kernel and a Kallinger PSD is a 
+        simple harmonic oscillator with Q = 1/sqrt(2).
+        """
         if self.model == 'harvey':
-            return self.psd_harvey(nu, self.sigma, self.tau)
-        elif self.model == 'kallinger':
-            return self.psd_kallinger(nu, self.sigma, self.tau)
-        else:
-            return self.psd_general(nu, self.sigma, self.tau, self.C)
-
-    def sample(self, t=None, change_random_state=False):
-        if not change_random_state:
-            rng.set_state(self.random_state)
-        if t is None:
-            t = self._get_t()
-
-        try:
-            assert t.unit == units.day
-        except AttributeError:
-            t = t * units.day
-
-        minf = 1 / t.ptp() # periods up to the timespan
-        maxf = 1 / (2*np.ediff1d(t).min()) # down to the min time spacing
-        # freq comes in 1/d from autofrequency
-        freq = LombScargle(t, np.zeros_like(t)).autofrequency(
-                    minimum_frequency=minf, maximum_frequency=maxf,
-                    # samples_per_peak=1/int(t.size/100)
-                    )
-        # print(freq.size)
-        nu = freq.to(units.Hz)
-
-        if self.model == 'harvey':
-            power = self.psd_harvey(nu, self.sigma, self.tau)
+            variance = self._A * np.pi / (2 * self._B)
+            return np.array([[variance, 0., 2 * np.pi / self._B * _day, 0.]])
         elif self.model == 'kallinger':
-            power = self.psd_kallinger(nu, self.sigma, self.tau)
-        else:
-            power = self.psd_general(nu, self.sigma, self.tau, self.C)
-        
-        y = timeseries_from_power_spectrum(nu, power)
-        y = y[:t.size]
-
-        y = normalise_timeseries(nu, power, t, y)
-        
-        # in the middle of all this we lost a factor of 1000
-        # (the units of y are Hz(1/2) m / (s uHz(1/2))
-        factor = (units.Hz / units.uHz)**(1/2)
-        y = y * factor.decompose().scale / factor
-
-        return y
-
+            variance = self._A * np.pi / (2 * np.sqrt(2) * self._B)
+            c = 2 * np.pi / self._B / np.sqrt(2) * _day
+            return np.array([[variance, variance, c, c]])
+        raise ValueError('only the "harvey" and "kallinger" models have a '
+                         'celerite representation')
+
+    def covariance(self, tau):
+        """ The covariance function (in m²/s²) at time lags `tau` (in 
+        days): analytic for the 'harvey' and 'kallinger' models, otherwise 
+        computed from the PSD """
+        if self.model in ('harvey', 'kallinger'):
+            return _celerite.kernel(tau, self.celerite_terms())
+        return autocovariance_from_psd(self._psd, tau, self._bandwidth(1e-4))
@@ -0,0 +1,177 @@
+import os
+import json
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from . import kepler
+from .components import Model
+from ._sampling import TimeSampling
+from ._detection import periodogram_detection
+
+__all__ = ['InjectionRecovery']
+
+
+def _with_seed(component, seed):
+    """ A copy of `component` (or of all components of a Model) drawing
+    random numbers from the SeedSequence `seed` """
+    if isinstance(component, Model):
+        seeds = seed.spawn(len(component.components))
+        return Model(*[_with_seed(c, s)
+                       for c, s in zip(component.components, seeds)])
+    c = copy(component)
+    c._init_rng(seed)
+    return c
+
+
+def _run_task(engine, task, filename):
+    results = engine.run_task(task)
+    # write to a temporary file first, so that only complete shards exist
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **results)
+    os.replace(tmp, filename)
+    return task
+
+
+class InjectionRecovery(object):
+    """
+    Injection-recovery tests: Keplerian signals with all combinations of
+    periods `P`, semi-amplitudes `K` and eccentricities `e` are added to
+    `n_realizations` realizations of the `noise` model, at the times of
+    `sampling` (a TimeSampling or an array), and each simulated dataset is
+    passed to `detect` to decide if the planet was recovered.
+
+    The (realization, P, K, e) space is split into tasks of `chunk_size`
+    datasets, which are run in parallel by `run`. Random numbers are
+    deterministic for a given `seed`: realization r of the noise comes from
+    SeedSequence(seed, spawn_key=(0, r)), so it is the same for every
+    injected planet, and the argument of periastron and time of periastron
+    of the planets in task i come from SeedSequence(seed, spawn_key=(1, i)).
+
+    `detect(t, y, P)` receives the times, the simulated datasets as an
+    (n, t.size) array and the injected periods, and should return a dict
+    of arrays of length n (e.g. `periodogram_detection`).
+    """
+    def __init__(self, noise, sampling, P, K, e=0., n_realizations=1,
+                 seed=None, chunk_size=1000, detect=periodogram_detection):
+        self.noise = noise
+        if isinstance(sampling, TimeSampling):
+            sampling = sampling.get_times()
+        self.t = np.asarray(sampling, dtype=float)
+        self.P, self.K, self.e = [np.atleast_1d(np.asarray(x, dtype=float))
+                                  for x in (P, K, e)]
+        self.n_realizations = n_realizations
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.detect = detect
+
+    def __repr__(self):
+        return "InjectionRecovery(%d datasets in %d tasks)" % \
+            (self.size, self.n_tasks)
+
+    @property
+    def shape(self):
+        return (self.n_realizations, self.P.size, self.K.size, self.e.size)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def n_tasks(self):
+        return -(-self.size // self.chunk_size)
+
+    def _config(self):
+        return {'shape': list(self.shape), 'seed': str(self.seed),
+                'chunk_size': self.chunk_size,
+                'P': self.P.tolist(), 'K': self.K.tolist(),
+                'e': self.e.tolist()}
+
+    def run_task(self, task):
+        """ Simulate and analyse the datasets of one task """
+        start = task * self.chunk_size
+        stop = min(start + self.chunk_size, self.size)
+        index = np.arange(start, stop)
+        r, iP, iK, ie = np.unravel_index(index, self.shape)
+        P, K, e = self.P[iP], self.K[iK], self.e[ie]
+
+        rng = np.random.default_rng(
+            np.random.SeedSequence(self.seed, spawn_key=(1, task)))
+        omega = rng.uniform(0, 2 * np.pi, index.size)
+        Tp = self.t[0] + P * rng.uniform(0, 1, index.size)
+
+        y = kepler.rv_curve_grid(self.t, P, K, e, omega, Tp).T
+        for realization in np.unique(r):
+            seed = np.random.SeedSequence(self.seed, spawn_key=(0, realization))
+            y[r == realization] += _with_seed(self.noise, seed).sample(self.t)
+
+        results = {'index': index, 'realization': r, 'P': P, 'K': K, 'e': e,
+                   'omega': omega, 'Tp': Tp}
+        results.update(self.detect(self.t, y, P))
+        return results
+
+    def run(self, directory, max_workers=None):
+        """
+        Run all tasks which don't have results in `directory` yet, using up
+        to `max_workers` processes (all cores by default; if 1, everything
+        runs in this process). Each task's results are written to their own
+        file as soon as they are ready, so an interrupted run can be resumed
+        by calling `run` again with the same directory.
+        Returns the results as in `load`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        config_file = os.path.join(directory, 'config.json')
+        if os.path.exists(config_file):
+            with open(config_file) as f:
+                if json.load(f) != self._config():
+                    raise ValueError('%s holds results from a different '
+                                     'injection-recovery run' % directory)
+        else:
+            with open(config_file, 'w') as f:
+                json.dump(self._config(), f)
+
+        pending = [(task, self._shard(directory, task))
+                   for task in range(self.n_tasks)
+                   if not os.path.exists(self._shard(directory, task))]
+
+        if max_workers == 1:
+            for task, filename in pending:
+                _run_task(self, task, filename)
+        elif pending:
+            with ProcessPoolExecutor(max_workers) as executor:
+                futures = [executor.submit(_run_task, self, task, filename)
+                           for task, filename in pending]
+                for future in as_completed(futures):
+                    future.result()
+
+        return self.load(directory)
+
+    @staticmethod
+    def _shard(directory, task):
+        return os.path.join(directory, 'task-%06d.npz' % task)
+
+    @staticmethod
+    def load(directory):
+        """ Load the (possibly partial) results stored in `directory`, as a
+        dict of arrays ordered by dataset index """
+        files = sorted(f for f in os.listdir(directory)
+                       if f.startswith('task-') and f.endswith('.npz'))
+        shards = []
+        for f in files:
+            with np.load(os.path.join(directory, f)) as shard:
+                shards.append(dict(shard))
+        if not shards:
+            return {}
+        results = {key: np.concatenate([s[key] for s in shards])
+                   for key in shards[0]}
+        order = np.argsort(results['index'])
+        return {key: value[order] for key, value in results.items()}
+
+    def detection_probability(self, results):
+        """ Fraction of realizations in which the planet was detected, for
+        each (P, K, e), from complete `results` """
+        detected = results['detected'].astype(float)
+        return detected.reshape(self.shape).mean(axis=0)
@@ -1,12 +1,13 @@
 import numpy as np
-import numpy.random as rng
 from scipy import stats
 from .components import Component
 
 __all__ = ['WhiteNoise', 'DistributedNoise']
 
 class WhiteNoise(Component):
-    def __init__(self, sd=None, var=None):
+    gaussian = True
+
+    def __init__(self, sd=None, var=None, seed=None):
         self._sd, self._var = None, None
 
         if sd is None and var is None:
@@ -16,7 +17,7 @@ class WhiteNoise(Component):
         elif var is None:
             self.sd = float(sd)
 
-        self.random_state = rng.get_state()
+        self._init_rng(seed)
 
     @property
     def sd(self):
@@ -45,19 +46,33 @@ class WhiteNoise(Component):
     def __condensed_repr__(self):
         return "WN(%.1f)" % self.sd
 
+    def covariance(self, tau):
+        return np.where(np.asarray(tau) == 0, self.var, 0.)
+
+    def _covariance_matrix(self, t):
+        # independent for each observation, even at the same time
+        return self.var * np.eye(t.size)
+
     def sample(self, t=None, change_random_state=False):
-        if not change_random_state:
-            rng.set_state(self.random_state)
         if t is None:
             if self.sampling is None:
                 raise ValueError('provide `t` or use set_sampling')
             t = self.sampling.get_times()
 
+        rng = self._get_rng(change_random_state)
         return rng.normal(loc=0., scale=self.sd, size=t.size)
 
+    def sample_many(self, n, t=None, change_random_state=False):
+        """ `n` realizations at times `t`, as an array of shape (n, t.size) """
+        if t is None:
+            t = self._get_t()
+
+        rng = self._get_rng(change_random_state)
+        return rng.normal(loc=0., scale=self.sd, size=(n, t.size))
+
 
 class DistributedNoise(Component):
-    def __init__(self, distribution, *args):
+    def __init__(self, distribution, *args, seed=None):
         self.distribution = distribution
         if isinstance(distribution, stats.rv_continuous):
             self.frozen = False
@@ -66,7 +81,7 @@ class DistributedNoise(Component):
             self.frozen = True
             self.args = distribution.args
 
-        self.random_state = rng.get_state()
+        self._init_rng(seed)
 
     def __repr__(self):
         if self.frozen:
@@ -77,16 +92,39 @@ class DistributedNoise(Component):
         return "%sNoise(args=%s)" % \
             (name, self.args)
 
+    @property
+    def var(self):
+        if self.frozen:
+            return self.distribution.var()
+        return self.distribution.var(*self.args)
+
+    def covariance(self, tau):
+        return np.where(np.asarray(tau) == 0, self.var, 0.)
+
+    def _covariance_matrix(self, t):
+        return self.var * np.eye(t.size)
+
     def sample(self, t=None, change_random_state=False):
         if t is None:
             if self.sampling is None:
                 raise ValueError('provide `t` or use set_sampling')
             t = self.sampling.get_times()
 
-        if not change_random_state:
-            rng.set_state(self.random_state)
+        rng = self._get_rng(change_random_state)
+        if self.frozen:
+            return self.distribution.rvs(size=t.size, random_state=rng)
+        else:
+            return self.distribution.rvs(*self.args, size=t.size,
+                                         random_state=rng)
+
+    def sample_many(self, n, t=None, change_random_state=False):
+        """ `n` realizations at times `t`, as an array of shape (n, t.size) """
+        if t is None:
+            t = self._get_t()
 
+        rng = self._get_rng(change_random_state)
         if self.frozen:
-            return self.distribution.rvs(size=t.size)
+            return self.distribution.rvs(size=(n, t.size), random_state=rng)
         else:
-            return self.distribution.rvs(*self.args, size=t.size)
+            return self.distribution.rvs(*self.args, size=(n, t.size),
+                                         random_state=rng)
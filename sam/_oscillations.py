@@ -1,11 +1,9 @@
+from math import erf
 import numpy as np
-import numpy.random as rng
-from .components import Component
+from .components import StochasticComponent
 from . import units
-from .utils import timeseries_from_power_spectrum, normalise_timeseries,\
-                   _pprint, _pprints
-
-from astropy.stats import LombScargle
+from .utils import _pprint, _pprints
+from . import _celerite
 
 __all__ = ['Oscillation',]
 
@@ -14,32 +12,71 @@ sigma_units = (units.ms**2/units.uHz)
 width_units = units.uHz
 numax_units = units.uHz
 
-class Oscillation(Component):
-    def __init__(self, sigma=1.0, width=0.5, numax=3000, model='lorentzian'):
+# internally, PSDs are evaluated on plain arrays in SI units:
+# sigma in m²/s²/Hz, width, numax and frequencies in Hz
+_sigma_si = sigma_units.to(units.ms**2/units.Hz)
+_width_si = width_units.to(units.Hz)
+_numax_si = numax_units.to(units.Hz)
+_day = units.day.to(units.s)
+
+class Oscillation(StochasticComponent):
+    """
+    Oscillation signal with a Lorentzian or Gaussian PSD centred on numax.
+    Time series are simulated with `method` 'fft', 'interpolate', 
+    'celerite' (only for the Lorentzian, an exponentially damped cosine 
+    kernel) or 'cholesky' (either model); see StochasticComponent.
+    `grid_tolerance`, `grid_resolution` and `max_grid_size` set the 
+    accuracy and size of the frequency grid of method='interpolate'.
+    """
+    def __init__(self, sigma=1.0, width=0.5, numax=3000, model='lorentzian',
+                 seed=None, method='fft', grid_tolerance=1e-3, 
+                 grid_resolution=None, max_grid_size=2**16):
+        self.sigma, self.width, self.numax = sigma, width, numax
+        assert model.lower() in ('lorentzian', 'gaussian'), \
+            'Oscillation `model` should be "lorentzian" or "gaussian".'
+        self.model = model.lower()
+        self._init_method(method, grid_tolerance, grid_resolution, 
+                          max_grid_size)
+        self._init_rng(seed)
+
+    @property
+    def sigma(self):
+        return self._sigma
+    @sigma.setter
+    def sigma(self, value):
         try:
-            assert sigma.unit == sigma_units, \
+            assert value.unit == sigma_units, \
                 'Units of `sigma` in Oscillation should be %s' % sigma_units
         except AttributeError:
-            sigma = sigma * sigma_units
-
+            value = value * sigma_units
+        self._sigma = value
+        self._A = value.value * _sigma_si
+
+    @property
+    def width(self):
+        return self._width
+    @width.setter
+    def width(self, value):
         try:
-            assert width.unit == width_units, \
+            assert value.unit == width_units, \
                 'Units of `width` in Oscillation should be %s' % width_units
         except AttributeError:
-            width = width * width_units
-
+            value = value * width_units
+        self._width = value
+        self._G = value.value * _width_si
+
+    @property
+    def numax(self):
+        return self._numax
+    @numax.setter
+    def numax(self, value):
         try:
-            assert numax.unit == numax_units, \
+            assert value.unit == numax_units, \
                 'Units of `numax` in Oscillation should be %s' % numax_units
         except AttributeError:
-            numax = numax * numax_units
-
-        self.sigma, self.width, self.numax = sigma, width, numax
-        assert model.lower() in ('lorentzian', 'gaussian'), \
-            'Oscillation `model` should be "lorentzian" or "gaussian".'
-        self.model = model
-
-        self.random_state = rng.get_state()
+            value = value * numax_units
+        self._numax = value
+        self._nu0 = value.value * _numax_si
 
     def __repr__(self):
         s, w, n = self.sigma, self.width, self.numax
@@ -70,45 +107,58 @@ class Oscillation(Component):
 
     def get_psd(self, nu):
         assert nu.unit == units.Hz
+        return self._psd(nu.to_value(units.Hz)) / _sigma_si * sigma_units
+
+    def _psd(self, nu):
+        """ The PSD in m²/s²/Hz at frequencies `nu` in Hz, without units """
+        A, G, nu0 = self._A, self._G, self._nu0
         if self.model == 'lorentzian':
-            return self.psd_lorentzian(nu, self.sigma, self.width, self.numax)
+            return A * G**2 / ((nu - nu0)**2 + G**2)
         elif self.model == 'gaussian':
-            return self.psd_gaussian(nu, self.sigma, self.width, self.numax)
-
-    def sample(self, t=None, change_random_state=False):
-        if not change_random_state:
-            rng.set_state(self.random_state)
-        if t is None:
-            t = self._get_t()
+            c = 4 * np.log(2)
+            return A * np.exp(- c * (nu-nu0)**2 / G**2)
 
-        try:
-            assert t.unit == units.day
-        except AttributeError:
-            t = t * units.day
-            
-        minf = 1 / t.ptp() # periods up to the timespan
-        maxf = 1 / (2*np.ediff1d(t).min()) # down to the min time spacing
-        # freq comes in 1/d from autofrequency
-        freq = LombScargle(t, np.zeros_like(t)).autofrequency(
-                    minimum_frequency=minf, maximum_frequency=maxf,
-                    # samples_per_peak=1/int(t.size/100)
-                    )
-        # print(freq.size)
-        nu = freq.to(units.Hz)
+    def _variance(self):
+        """ The integral of the PSD, in m²/s² """
+        A, G, nu0 = self._A, self._G, self._nu0
+        if self.model == 'lorentzian':
+            return A * G * (np.pi / 2 + np.arctan(nu0 / G))
+        elif self.model == 'gaussian':
+            c = 4 * np.log(2)
+            return A * G / 2 * np.sqrt(np.pi / c) * (1 + erf(np.sqrt(c) * nu0 / G))
 
+    def _bandwidth(self, tolerance):
+        """ Frequency (in Hz) above which there is at most a fraction 
+        `tolerance` of the power (from the asymptotic tail of the PSD) """
+        G, nu0 = self._G, self._nu0
         if self.model == 'lorentzian':
-            power = self.psd_lorentzian(nu, self.sigma, self.width, self.numax)
+            return nu0 + G / (np.pi * tolerance)
         elif self.model == 'gaussian':
-            power = self.psd_gaussian(nu, self.sigma, self.width, self.numax)
-        
-        y = timeseries_from_power_spectrum(nu, power)
-        y = y[:t.size]
-
-        y = normalise_timeseries(nu, power, t, y)
-        
-        # in the middle of all this we lost a factor of 1000
-        # (the units of y are Hz(1/2) m / (s uHz(1/2))
-        factor = (units.Hz / units.uHz)**(1/2)
-        y = y * factor.decompose().scale / factor
-
-        return y
+            return nu0 + G * np.sqrt(np.log(1 / tolerance) / (4 * np.log(2)))
+
+    def _psd_key(self):
+        return (self.model, self._A, self._G, self._nu0)
+
+    def celerite_terms(self):
+        """ 
+        The (a, b, c, d) celerite term with this PSD, in (m/s)² and 1/day: 
+        a Lorentzian is an exponentially damped cosine kernel
+        """
+        if self.model != 'lorentzian':
+            raise ValueError('only the "lorentzian" model has a celerite '
+                             'representation')
+        a = np.pi * self._A * self._G
+        c, d = 2 * np.pi * self._G * _day, 2 * np.pi * self._nu0 * _day
+        return np.array([[a, 0., c, d]])
+
+    def covariance(self, tau):
+        """ The covariance function (in m²/s²) at time lags `tau` (in 
+        days), neglecting the power at negative frequencies """
+        if self.model == 'lorentzian':
+            return _celerite.kernel(tau, self.celerite_terms())
+        # the Fourier transform of the Gaussian
+        A, G, nu0 = self._A, self._G, self._nu0
+        tau = np.asarray(tau) * _day
+        c = 4 * np.log(2)
+        return A * G * np.sqrt(np.pi / c) * \
+            np.exp(-(np.pi * G * tau)**2 / c) * np.cos(2 * np.pi * nu0 * tau)
@@ -1,6 +1,5 @@
 from collections import namedtuple
 from functools import partial
-from itertools import product
 
 import numpy as np
 import numpy.random as rng
@@ -18,6 +17,9 @@ period_prior = stats.uniform(1.1, 1.1+1000)
 semi_amplitude_prior = stats.uniform(0.0, 100)
 ecc_prior = stats.beta(a=0.867, b=3.03)
 
+# approximate number of RV values computed at once when evaluating grids
+grid_block_elements = 2**21
+
 
 
 def _parse_orbital_parameters(orbi):
@@ -224,23 +226,96 @@ class Planet(Component):
                * self.P**(1./3) * self.K * np.sqrt(1-self.e**2)
         return m_mj
 
-    def getrv(self, t):
-        if self.grid:
-            args = []
-            for var in ['P', 'K', 'e']:
-                if var in self.grid_parameters:
-                    args.append(getattr(self, var))
-                else:
-                    args.append([getattr(self, var)])
-            args.append([self.w])
-            args.append([self.Tp])
-
-            pars = list(map(np.array, product(*args)))
-            return kepler.rv_curve(t, pars)
+    def _grid_shape(self):
+        return tuple(np.size(getattr(self, var))
+                     if var in self.grid_parameters else 1
+                     for var in ['P', 'K', 'e'])
 
-        else:
+    def orbit_block(self, start=0, stop=None):
+        """ 
+        Orbital parameters (P, K, e, omega, Tp) of the grid orbits with 
+        indices in [start, stop). Orbits are ordered as in 
+        itertools.product(P, K, e), but no product is ever built.
+        """
+        if stop is None:
+            stop = self.gridsize
+        indices = np.unravel_index(np.arange(start, stop), self._grid_shape())
+        P, K, e = [np.atleast_1d(getattr(self, var))[i]
+                   for var, i in zip(['P', 'K', 'e'], indices)]
+        n = P.size
+        return P, K, e, np.full(n, self.w), np.full(n, self.Tp)
+
+    def iter_rv(self, t, block_size=None, dtype=np.float64):
+        """ 
+        Evaluate the RV curves of the grid orbits in blocks of `block_size` 
+        orbits, yielding (slice, rv) pairs where rv has shape 
+        (t.size, block size) and `slice` selects the block's orbits.
+        By default, blocks hold about `grid_block_elements` values.
+        """
+        t = np.atleast_1d(t)
+        if block_size is None:
+            block_size = max(1, grid_block_elements // t.size)
+
+        for start in range(0, self.gridsize, block_size):
+            stop = min(start + block_size, self.gridsize)
+            rv = kepler.rv_curve_grid(t, *self.orbit_block(start, stop))
+            yield slice(start, stop), rv.astype(dtype, copy=False)
+
+    def getrv(self, t, out=None, block_size=None, dtype=None, callback=None,
+              filename=None):
+        """ 
+        The RV curve(s) of this planet at times `t`. For a grid of orbits,
+        the result has shape (t.size, gridsize) and is evaluated in blocks 
+        of orbits, which keeps memory bounded:
+            out: write the result into this (possibly memory-mapped) array
+            block_size: number of orbits in each block (see `iter_rv`)
+            dtype: data type of the result (e.g. np.float32)
+            callback: function called as callback(slice, rv) for each block;
+                      if no `out` or `filename` is given, nothing is stored
+                      and None is returned
+            filename: create the result as a memory-mapped .npy file
+        """
+        if not self.grid:
             return kepler.rv_curve(t, self.orbital_parameters)
 
+        t = np.atleast_1d(t)
+        shape = (t.size, self.gridsize)
+
+        if out is None and callback is None and filename is None:
+            # everything at once
+            if block_size is None:
+                block_size = self.gridsize
+            out = np.empty(shape, dtype=dtype or np.float64)
+
+        if dtype is None:
+            dtype = np.float64 if out is None else out.dtype
+        if out is None and filename is not None:
+            out = np.lib.format.open_memmap(filename, mode='w+',
+                                            dtype=dtype, shape=shape)
+        if out is not None and out.shape != shape:
+            raise ValueError('`out` should have shape %s' % (shape, ))
+
+        for sl, rv in self.iter_rv(t, block_size, dtype):
+            if out is not None:
+                out[:, sl] = rv
+            if callback is not None:
+                callback(sl, rv)
+
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    def jacobian(self, t):
+        """ 
+        The RV curve(s) of this planet at times `t` and their derivatives 
+        with respect to (P, K, e, omega, Tp), in the last axis (see 
+        kepler.rv_curve_jacobian). For a grid of orbits, the shapes are
+        (t.size, gridsize) and (t.size, gridsize, 5).
+        """
+        if not self.grid:
+            return kepler.rv_curve_jacobian(t, self.orbital_parameters)
+        return kepler.rv_curve_jacobian(t, kepler.OrbitBatch(*self.orbit_block()))
+
     def sample(self, t=None, *args):
         if t is None:
             if self.sampling is None:
@@ -275,6 +350,68 @@ class Jupiter(Planet):
 
 
 
+class PlanetarySystem(Component):
+    """ 
+    A system of planets with periods `P`, semi-amplitudes `K`, 
+    eccentricities `e`, arguments of periastron `omega` and times of 
+    periastron `Tp` (arrays, one value per planet). The RV signals of all
+    planets are summed in a single call to kepler.rv_curve_sum, instead of
+    one call per planet as in Planet(...) + Planet(...).
+    """
+    def __init__(self, P, K, e=0., omega=0., Tp=57000.):
+        P, K, e, omega, Tp = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(p, dtype=float))
+              for p in (P, K, e, omega, Tp)])
+        self.P, self.K, self.e, self.w, self.Tp = \
+            [p.copy() for p in (P, K, e, omega, Tp)]
+        super(PlanetarySystem, self).__init__()
+
+    @classmethod
+    def from_planets(cls, *planets):
+        """ The system with the given (single-orbit) Planets """
+        if any(p.grid for p in planets):
+            raise ValueError('planets with a grid of orbits cannot be part '
+                             'of a PlanetarySystem')
+        return cls(*np.array([p.orbital_parameters for p in planets],
+                             dtype=float).T)
+
+    def __repr__(self):
+        return "PlanetarySystem(%d planets, P=%s)" % \
+            (len(self), np.array2string(self.P, precision=2))
+
+    def __len__(self):
+        return self.P.size
+
+    @property
+    def planets(self):
+        return [Planet(P=P, K=K, e=e, omega=w, Tp=Tp)
+                for P, K, e, w, Tp in zip(self.P, self.K, self.e, self.w,
+                                          self.Tp)]
+
+    def getrv(self, t, out=None, backend=None):
+        """ The total RV of all planets at times `t`, optionally written 
+        into the array `out` """
+        return kepler.rv_curve_sum(t, self.P, self.K, self.e, self.w, self.Tp,
+                                   backend=backend, out=out)
+
+    def jacobian(self, t):
+        """ The RV of each planet at times `t` and its derivatives with 
+        respect to (P, K, e, omega, Tp), with shapes (t.size, n_planets) 
+        and (t.size, n_planets, 5) """
+        batch = kepler.OrbitBatch(self.P, self.K, self.e, self.w, self.Tp)
+        return kepler.rv_curve_jacobian(t, batch)
+
+    def sample(self, t=None, *args):
+        if t is None:
+            if self.sampling is None:
+                raise ValueError('provide `t` or use set_sampling')
+            t = self.sampling.get_times()
+            return t, self.getrv(t)
+        else:
+            return self.getrv(t)
+
+
+
 # class Mercury(Planet):
 #     def __init__(self):
 #         super(Mercury, self).__init__(P=87.968, e=0.2056, K=, 
@@ -317,7 +454,7 @@ class Offset(Component):
     def __repr__(self):
         return "Offset(%4.2f m/s)" % self.value
 
-    def sample(self, t=None):
+    def sample(self, t=None, *args):
         if t is None:
             if self.sampling is None:
                 raise ValueError('provide `t` or use set_sampling')
@@ -339,7 +476,7 @@ class Slope(Component):
     def __repr__(self):
         return "Slope(%4.2f m/s/[unit of time])" % self.slope
 
-    def sample(self, t=None):
+    def sample(self, t=None, *args):
         if t is None:
             if self.sampling is None:
                 raise ValueError('provide `t` or use set_sampling')
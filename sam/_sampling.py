@@ -1,4 +1,8 @@
 # import pandas as pd
+import os
+import glob
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt 
 
@@ -17,55 +21,186 @@ import matplotlib.pyplot as plt
 #     return t,y,e
 
 
-def read_RV_file(filename):
-    t,y,e = [],[],[]
+def _is_number(token):
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def _split_rdb(filename):
+    """ 
+    Read `filename` once and split it into the column names (from the header
+    line, if there is one) and the data lines, skipping comments and the
+    '---' line of .rdb files
+    """
     with open(filename) as f:
-        for line in f.readlines():
-            if line.startswith('#'):
-                continue
-            split_line = line.split()
-            if '--' in split_line[0]:
-                continue
+        lines = [line for line in f.read().splitlines()
+                 if line.strip() and not line.lstrip().startswith('#')]
 
-            try:
-                t.append(float(split_line[0]))
-                y.append(float(split_line[1]))
-                e.append(float(split_line[2]))
-            except ValueError:
-                continue
+    names = None
+    if lines and not _is_number(lines[0].split()[0]):
+        names = lines.pop(0).split()
+    if lines and '--' in lines[0].split()[0]:
+        lines.pop(0)
+    return names, lines
 
-            # print line.split()
-    assert len(t) == len(y) == len(e), 'Different sizes!'
-    return tuple(map(np.array, [t,y,e]))
 
+def read_rdb(filename):
+    """ 
+    Read a .rdb (or whitespace-separated text) file of RVs in a single pass.
+    Returns time, RV and error as arrays, and a dict with the extra columns,
+    named as in the header (or 'col3', 'col4', ...). Lines which cannot be
+    parsed as numbers are skipped.
+    """
+    names, lines = _split_rdb(filename)
+    try:
+        data = np.loadtxt(lines, ndmin=2)
+    except ValueError:
+        # irregular lines; parse what can be parsed and drop the rest
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            data = np.genfromtxt(lines, invalid_raise=False, ndmin=2)
+        data = data[~np.isnan(data[:, :3]).any(axis=1)]
 
-def has_extras(filename):
-    # num_columns = pd.read_csv(filename, sep='\s+', comment='#', nrows=1).shape[1]
-    # file seems to have extras, besides time,RV,Rverr
-    with open(filename) as f:
-        for line in f.readlines():
-            if line.startswith('#'):
-                continue
-            split_line = line.split()
-            if '--' in split_line[0]:
-                continue
-            else:
-                num_columns = len(split_line)
+    if data.shape[1] < 3:
+        raise ValueError('%s should have at least 3 columns '
+                         '(time, RV, error)' % filename)
+    if names is None or len(names) != data.shape[1]:
+        names = ['col%d' % i for i in range(data.shape[1])]
+
+    t, y, e = data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy()
+    extras = {name: data[:, i].copy() for i, name in enumerate(names) if i > 2}
+    return t, y, e, extras
 
-    return num_columns > 3
+
+def read_rdb_directory(directory, pattern='*.rdb', max_workers=None):
+    """ 
+    Read all files matching `pattern` in `directory` with `read_rdb`, in 
+    parallel threads. Returns a dict of {filename: (t, y, e, extras)}, 
+    sorted by filename.
+    """
+    filenames = sorted(glob.glob(os.path.join(directory, pattern)))
+    with ThreadPoolExecutor(max_workers) as executor:
+        results = executor.map(read_rdb, filenames)
+    return dict(zip(filenames, results))
+
+
+def read_RV_file(filename):
+    t, y, e, _ = read_rdb(filename)
+    return t, y, e
+
+
+def has_extras(filename):
+    """ Whether the file has columns besides time, RV and error """
+    _, lines = _split_rdb(filename)
+    return bool(lines) and len(lines[0].split()) > 3
 
 
 def read_extras(filename):
-    pass
+    return read_rdb(filename)[3]
+
+
+def generate_schedules(n, nobs=30, duration=365., start=0., season=None,
+                       weather=0., min_spacing=1, night_window=0.2, rng=None):
+    """ 
+    Generate `n` random observing schedules of `nobs` times each, over
+    `duration` days from `start`, as an array with shape (n, nobs).
+
+    At most one observation is taken per night, at a random time within
+    `night_window`/2 days of the middle of the night (that is, in a window
+    of `night_window` days centred on it). Optionally, the target
+    is only visible during the first `season` fraction of each year from
+    `start`, each night is lost to bad weather with probability `weather`
+    (independently for each schedule), and consecutive observations are at 
+    least `min_spacing` nights apart. All schedules are drawn at once.
+
+    The spacing is counted in available nights: consecutive observations are
+    at least `min_spacing` available nights apart, so they are also at least
+    that many nights apart. When every night is available the nights are
+    chosen uniformly among those with the minimum spacing; otherwise, pairs 
+    of nights closer than `min_spacing` in the list of available nights 
+    (e.g. on both sides of a gap) are never chosen together, even if they 
+    are further apart in time.
+    """
+    if min_spacing < 1:
+        raise ValueError('min_spacing should be at least 1 night')
+    rng = np.random.default_rng(rng)
+    nights = np.arange(int(np.ceil(duration)))
+    available = np.ones((n, nights.size), dtype=bool)
+    if season is not None:
+        available &= (nights % 365.25) < season * 365.25
+    if weather:
+        available &= rng.random((n, nights.size)) >= weather
+
+    # available nights first, in order, for each schedule
+    order = np.argsort(~available, axis=1, kind='stable')
+    # choosing nobs among n_available - (nobs-1)*(min_spacing-1) slots and
+    # spreading them out by min_spacing-1 gives uniformly random nights with
+    # the minimum spacing
+    spread = (nobs - 1) * (min_spacing - 1)
+    slots = available.sum(axis=1) - spread
+    if slots.min() < nobs:
+        raise ValueError('not enough available nights for %d observations '
+                         'with the given constraints' % nobs)
+
+    keys = rng.random((n, slots.max()))
+    keys[np.arange(slots.max()) >= slots[:, np.newaxis]] = np.inf
+    chosen = np.sort(np.argpartition(keys, nobs - 1, axis=1)[:, :nobs], axis=1)
+    chosen += np.arange(nobs) * (min_spacing - 1)
+
+    times = np.take_along_axis(order, chosen, axis=1).astype(float)
+    times += night_window * (rng.random((n, nobs)) - 0.5)
+    return start + times
+
+
+def _sorted_diffs(times):
+    times = np.asarray(times, dtype=float)
+    diffs = np.diff(times, axis=-1)
+    if (diffs < 0).any():
+        diffs = np.diff(np.sort(times, axis=-1), axis=-1)
+    return diffs
+
+
+def schedule_gaps(times, factor=5.):
+    """ 
+    Fraction of the time span of each schedule (the last axis of `times`)
+    spent in gaps, that is, in intervals between consecutive observations
+    longer than `factor` times the median interval
+    """
+    diffs = _sorted_diffs(times)
+    threshold = factor * np.median(diffs, axis=-1, keepdims=True)
+    gaps = np.where(diffs > threshold, diffs, 0.).sum(axis=-1)
+    return gaps / diffs.sum(axis=-1)
+
+
+def schedule_coverage(times, window=1.):
+    """ 
+    Fraction of the time span of each schedule (the last axis of `times`)
+    which is within `window`/2 days of an observation
+    """
+    diffs = _sorted_diffs(times)
+    covered = np.minimum(diffs, window).sum(axis=-1) + window
+    return np.minimum(covered / (diffs.sum(axis=-1) + window), 1.)
+
 
 class TimeSampling(object):
-    def __init__(self, times, nobs=30, duration=None):
-        
+    """ 
+    The times of the observations. If `times` is None, a random schedule of
+    `nobs` observations over `duration` days (one year by default) is 
+    generated, and `kwargs` are passed to `generate_schedules`.
+    """
+    def __init__(self, times=None, nobs=30, duration=None, **kwargs):
+        if times is None:
+            if duration is None:
+                duration = 365.
+            times = generate_schedules(1, nobs, duration, **kwargs)[0]
         self.time = times
 
     @property
     def duration(self):
-        return self.time.ptp()
+        return np.ptp(self.time)
     
     @property
     def nobs(self):
@@ -76,22 +211,39 @@ class TimeSampling(object):
 
     @classmethod
     def from_file(cls, filename):
-        # try reading the file
-        t,y,e = read_RV_file(filename)
-        if has_extras(filename):
-            pass
-            # extras = read_extras(filename)
+        """ The times in a .rdb file; the RVs, errors and any extra columns
+        are kept in the `vrad`, `svrad` and `extras` attributes """
+        t, y, e, extras = read_rdb(filename)
+        sampling = cls(times=t, nobs=t.size, duration=np.ptp(t))
+        sampling.vrad, sampling.svrad, sampling.extras = y, e, extras
+        return sampling
 
-        nobs = t.size
-        duration = t.ptp()
+    @classmethod
+    def from_directory(cls, directory, pattern='*.rdb', max_workers=None):
+        """ One TimeSampling for each file in `directory`, read in parallel """
+        samplings = {}
+        for filename, (t, y, e, extras) in \
+                read_rdb_directory(directory, pattern, max_workers).items():
+            sampling = cls(times=t, nobs=t.size, duration=np.ptp(t))
+            sampling.vrad, sampling.svrad, sampling.extras = y, e, extras
+            samplings[filename] = sampling
+        return samplings
 
-        return cls(time=t, nobs=nobs, duration=duration)
 
+    @classmethod
+    def generate(cls, n, nobs=30, duration=365., **kwargs):
+        """ `n` random schedules, see `generate_schedules` """
+        return [cls(times) for times in
+                generate_schedules(n, nobs, duration, **kwargs)]
 
     @property
     def gaps(self):
         """ A very rough estimation of the percentage of gaps """
-        pass
+        return 100 * schedule_gaps(self.time)
+
+    def coverage(self, window=1.):
+        """ Fraction of the time span within `window`/2 of an observation """
+        return schedule_coverage(self.time, window)
 
     def plot(self):
         # if self.vrad is None
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import numpy as np
+
+__all__ = ['SimulationStore']
+
+
+class SimulationStore(object):
+    """
+    Binary, columnar, append-only storage for many simulated time series
+    sharing the same times.
+
+    A store is a directory with the times (`times.npy`), a `meta.json` index
+    and one .npy file per column per appended chunk. Each column holds one
+    row per realization: 'rv' holds the simulated RVs, with shape
+    (n, n_times), and other columns can hold e.g. the contribution of each
+    component. Chunks are written in one go with no per-row work, and
+    columns are read back by concatenating the (memory-mapped) chunks.
+
+    mode is 'a' to append to an existing store (or create it), 'w' to
+    overwrite any existing store, or 'r' to only read.
+    """
+    def __init__(self, path, t=None, mode='a'):
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError('mode should be "r", "a" or "w"')
+        self.path, self.mode = path, mode
+        self._meta_file = os.path.join(path, 'meta.json')
+
+        if mode == 'w' and os.path.exists(path):
+            shutil.rmtree(path)
+
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                self.meta = json.load(f)
+            self.t = np.load(os.path.join(path, 'times.npy'))
+            if t is not None and not np.array_equal(np.asarray(t), self.t):
+                raise ValueError('the times do not match the ones in %s' % path)
+        elif mode == 'r':
+            raise FileNotFoundError('no simulation store in %s' % path)
+        else:
+            if t is None:
+                raise ValueError('provide the times `t` to create a store')
+            os.makedirs(path, exist_ok=True)
+            self.t = np.asarray(t, dtype=float)
+            np.save(os.path.join(path, 'times.npy'), self.t)
+            self.meta = {'columns': [], 'chunks': [], 'attributes': {}}
+            self._write_meta()
+
+    def __repr__(self):
+        return "SimulationStore(%s, %d realizations, columns=%s)" % \
+            (self.path, len(self), self.columns)
+
+    def __len__(self):
+        return sum(self.meta['chunks'])
+
+    @property
+    def columns(self):
+        return list(self.meta['columns'])
+
+    @property
+    def attributes(self):
+        """ Extra metadata (anything JSON-serialisable) """
+        return self.meta['attributes']
+
+    def _write_meta(self):
+        tmp = self._meta_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_file)
+
+    def _chunk_file(self, chunk, column):
+        return os.path.join(self.path, 'chunk-%06d.%s.npy' % (chunk, column))
+
+    def append(self, rv, **columns):
+        """
+        Append a chunk of realizations: `rv` with shape (n, n_times) and
+        other `columns` with the same number of rows.
+        """
+        if self.mode == 'r':
+            raise ValueError('store was opened in read-only mode')
+        columns = dict(rv=rv, **columns)
+        columns = {k: np.atleast_2d(v) for k, v in columns.items()}
+        n = columns['rv'].shape[0]
+        if any(v.shape[0] != n for v in columns.values()):
+            raise ValueError('all columns should have the same number of rows')
+        if self.meta['chunks'] and set(columns) != set(self.columns):
+            raise ValueError('columns should be %s' % self.columns)
+
+        chunk = len(self.meta['chunks'])
+        for name, values in columns.items():
+            np.save(self._chunk_file(chunk, name), values)
+        # only now is the chunk part of the store
+        self.meta['columns'] = sorted(columns)
+        self.meta['chunks'].append(n)
+        self._write_meta()
+
+    def read(self, column='rv', mmap=True):
+        """ All rows of `column`, concatenated over the chunks """
+        if column not in self.meta['columns']:
+            raise KeyError('no column "%s" in store' % column)
+        mmap_mode = 'r' if mmap else None
+        chunks = [np.load(self._chunk_file(i, column), mmap_mode=mmap_mode)
+                  for i in range(len(self.meta['chunks']))]
+        return np.concatenate(chunks)
+
+    def iter_chunks(self, column='rv'):
+        """ Iterate over the (memory-mapped) chunks of `column` """
+        for i in range(len(self.meta['chunks'])):
+            yield np.load(self._chunk_file(i, column), mmap_mode='r')
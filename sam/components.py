@@ -1,27 +1,255 @@
 # -*- coding: utf-8 -*-
 import os
+import hashlib
+import warnings
+from copy import copy
+from functools import wraps
 import numpy as np
+from scipy.linalg import cholesky
 import matplotlib.pyplot as plt
 
 from ._sampling import TimeSampling
-from functools import reduce
-
-def deepgetattr(obj, attr):
-    """Recurses through an attribute chain to get the ultimate value."""
-    return reduce(getattr, attr.split('.'), obj)
+from .utils import LRUCache, array_key, as_days, cache_maxbytes, save_array, \
+                   frequency_grid, interpolation_grid, timeseries_from_psd, \
+                   timeseries_from_psd_interpolated
+from . import _celerite
+from .kepler import _cache_dir
+
+
+def _memoized(sample):
+    """ 
+    Wrap a component's `sample` method so that, if the component has a 
+    cache (see Component.memoize), results are looked up by the times and
+    the component parameters. Samples which change the random state, or 
+    without explicit times, are never cached.
+    """
+    @wraps(sample)
+    def wrapper(self, t=None, *args, **kwargs):
+        cache = self.__dict__.get('_sample_cache')
+        change_random_state = kwargs.get('change_random_state',
+                                         args[0] if args else False)
+        if cache is None or t is None or change_random_state:
+            return sample(self, t, *args, **kwargs)
+
+        key = (array_key(t), self._parameters_key())
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        y = sample(self, t, *args, **kwargs)
+        if isinstance(y, np.ndarray):
+            y.flags.writeable = False  # shared by all callers
+        cache[key] = y
+        return y
+
+    return wrapper
+
+
+def _hashable(value):
+    """ A hashable representation of a parameter value, or None to skip it """
+    if isinstance(value, (np.random.Generator, LRUCache, TimeSampling)):
+        return None
+    if isinstance(value, np.random.SeedSequence):
+        return ('seed', repr(value.entropy), value.spawn_key)
+    if isinstance(value, np.ndarray):
+        return (array_key(value), str(getattr(value, 'unit', '')))
+    if isinstance(value, (tuple, list)):
+        return tuple(map(_hashable, value))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ('id', id(value))
+
+
+# covariance matrices and their Cholesky factors, by times and parameters
+_covariances = LRUCache(maxsize=4, maxbytes=cache_maxbytes)
+_choleskys = LRUCache(maxsize=8, maxbytes=cache_maxbytes)
+
+
+def _cholesky_jitter(C, jitter=(1e-12, 1e-6)):
+    """ 
+    Cholesky factor of a covariance matrix `C` which is only positive 
+    semi-definite (up to round-off), as for densely sampled smooth kernels:
+    a jitter growing from jitter[0] to jitter[1] times the mean variance is 
+    added to the diagonal until the factorisation succeeds
+    """
+    scale = np.mean(np.diag(C))
+    eps = jitter[0]
+    while True:
+        try:
+            return cholesky(C + eps * scale * np.eye(C.shape[0]), lower=True)
+        except np.linalg.LinAlgError:
+            if eps >= jitter[1]:
+                raise
+            eps *= 10
 
 
 class Component(object):
     """ """
 
+    # whether the component is a Gaussian process, fully described by its
+    # covariance function (and zero mean)
+    gaussian = False
+
     def __init__(self, *args):
         self.sampling = None
         # self.pars = []
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # every component's sample method can be memoized
+        if 'sample' in cls.__dict__:
+            cls.sample = _memoized(cls.__dict__['sample'])
+
+    def memoize(self, maxsize=16):
+        """ 
+        Cache the results of `sample`, keyed on the times and on the values 
+        of the component parameters, keeping the `maxsize` most recently 
+        used. Changing a parameter automatically gives a new key. 
+        Cached arrays are read-only. Use maxsize=0 to stop caching.
+        """
+        self._sample_cache = LRUCache(maxsize) if maxsize else None
+
+    def _parameters_key(self):
+        """ A hashable key with the values of all the component parameters """
+        items = []
+        for name, value in sorted(vars(self).items()):
+            if name in ('_sample_cache', 'contributions'):
+                continue
+            value = _hashable(value)
+            if value is not None:
+                items.append((name, value))
+        return tuple(items)
+
     def __add__(self, b):
-        return Sum(self, b)
+        return Model(self, b)
     def __radd__(self, b):
-        return self.__add__(b)
+        if isinstance(b, int) and b == 0: # to allow sum([c1, c2, ...])
+            return self
+        return Model(b, self)
+
+    def covariance(self, tau):
+        """ 
+        The covariance function (in m²/s²) at time lags `tau` (in days). 
+        Deterministic components (planets, offsets, ...) have none.
+        """
+        return np.zeros(np.shape(tau))
+
+    def _covariance_key(self):
+        # the covariance doesn't depend on the random state or on how
+        # samples are simulated
+        skip = ('seed_sequence', 'sampling', 'method', 'grid_tolerance',
+                'grid_resolution', 'max_grid_size')
+        return (type(self).__name__, ) + \
+            tuple(item for item in self._parameters_key() if item[0] not in skip)
+
+    def _covariance_matrix(self, t):
+        return self.covariance(t[:, np.newaxis] - t)
+
+    def covariance_matrix(self, t=None):
+        """ The covariance matrix at times `t` (cached, read-only) """
+        if t is None:
+            t = self._get_t()
+        t = as_days(t)
+        key = (array_key(t), self._covariance_key())
+        C = _covariances.get(key)
+        if C is None:
+            C = self._covariance_matrix(t)
+            C.flags.writeable = False
+            _covariances[key] = C
+        return C
+
+    def cholesky(self, t=None, disk_cache=False):
+        """ 
+        The lower-triangular Cholesky factor L of the covariance matrix at
+        times `t`, with C = L L^T. Factors are kept in memory for the most
+        recently used times and parameters and, with `disk_cache`, also 
+        saved to (and memory-mapped from) the SAM cache directory, so that 
+        they are only computed once across sessions. Covariance matrices 
+        which are singular up to round-off get a small diagonal jitter.
+        """
+        if t is None:
+            t = self._get_t()
+        t = as_days(t)
+        key = (array_key(t), self._covariance_key())
+        L = _choleskys.get(key)
+        if L is not None:
+            return L
+
+        filename = os.path.join(_cache_dir(), 'covariance', 'cholesky-%s.npy' %
+                                hashlib.sha1(repr(key).encode()).hexdigest())
+        if disk_cache and os.path.exists(filename):
+            L = np.load(filename, mmap_mode='r')
+        else:
+            # the covariance matrix is not needed once L exists
+            C = _covariances.pop(key)
+            if C is None:
+                C = self._covariance_matrix(t)
+            try:
+                L = cholesky(C, lower=True)
+            except np.linalg.LinAlgError:
+                # repeated times are handled in _sample_cholesky
+                if np.unique(t).size < t.size:
+                    raise
+                L = _cholesky_jitter(C)
+            L.flags.writeable = False
+            if disk_cache:
+                save_array(filename, L, 'Cholesky factor')
+        _choleskys[key] = L
+        return L
+
+    def _sample_cholesky(self, t, size, rng, disk_cache=False):
+        """ 
+        `size` (or one) realizations at times `t`, drawn exactly from the 
+        covariance matrix C = L L^T as L @ Z, for a (t.size, size) array Z 
+        of standard normal numbers, with a single matrix product
+        """
+        try:
+            L = self.cholesky(t, disk_cache)
+        except np.linalg.LinAlgError:
+            # a singular covariance from repeated times (without white 
+            # noise) means equal values there: draw at the unique times
+            unique, inverse = np.unique(t, return_inverse=True)
+            if unique.size == t.size:
+                raise
+            y = self._sample_cholesky(unique, size, rng, disk_cache)
+            return y[..., inverse]
+        z = rng.normal(0, 1, (L.shape[0], 1 if size is None else size))
+        y = (L @ z).T
+        return y[0] if size is None else y
+
+    def _init_rng(self, seed=None):
+        """ 
+        Give this component its own random number stream. `seed` can be 
+        anything accepted by numpy.random.SeedSequence, or a SeedSequence.
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.rng = np.random.default_rng(seed)
+
+    def _get_rng(self, change_random_state=False):
+        """ 
+        The random number generator to use for one sample. Unless 
+        `change_random_state`, this is a fresh generator started from this
+        component's seed, so that repeated samples are the same.
+        """
+        if change_random_state:
+            return self.rng
+        return np.random.default_rng(self.seed_sequence)
+
+    def spawn(self, n):
+        """ 
+        `n` copies of this component with independent random streams, 
+        e.g. for generating realizations in parallel threads or processes
+        """
+        copies = []
+        for seed in self.seed_sequence.spawn(n):
+            c = copy(self)
+            c._init_rng(seed)
+            copies.append(c)
+        return copies
 
     def set_sampling(self, sampling):
         assert isinstance(sampling, TimeSampling), \
@@ -37,6 +265,16 @@ class Component(object):
         else:
             raise ValueError('provide `t` or use set_sampling')
 
+    def sample_many(self, n, t=None, change_random_state=False):
+        """ 
+        `n` realizations at times `t`, as an array of shape (n, t.size). 
+        Deterministic components simply repeat their signal.
+        """
+        if t is None:
+            t = self._get_t()
+        y = self.sample(t)
+        return np.repeat(y[np.newaxis], n, axis=0)
+
     def plots(self, t=None, ntt=None):
         if t is None:
             t = self._get_t()
@@ -54,18 +292,45 @@ class Component(object):
 
         plt.show()
 
-    def save_rdb(self, filename, t=None, error=None, units='ms'):
+    def _sample_many_parts(self, n, t, change_random_state):
+        """ `n` realizations and the contributions of each component """
+        return self.sample_many(n, t, change_random_state), {}
+
+    def save_realizations(self, path, n, t=None, mode='a', chunk_size=1000):
+        """ 
+        Simulate `n` realizations at times `t` and write them, together with
+        the contribution of each component of a Model, to the binary 
+        SimulationStore at `path`, in chunks of `chunk_size` realizations. 
+        With mode='a', realizations are appended to an existing store.
+        The random state of the components advances, so that every call
+        gives new realizations. Returns the store.
+        """
+        from ._store import SimulationStore
         if t is None:
             t = self._get_t()
 
-        if os.path.exists(filename):
-            print('File "%s" exists. Replace? (y/n) ' % filename, end=' ')
-            answer = input()
-            if answer == 'y':
-                pass
-            else:
-                print('aborting')
-                return
+        store = SimulationStore(path, t, mode)
+        store.attributes['components'] = \
+            [repr(c) for c in getattr(self, 'components', [self])]
+        for start in range(0, n, chunk_size):
+            size = min(chunk_size, n - start)
+            rv, parts = self._sample_many_parts(size, t, True)
+            store.append(rv, **parts)
+        return store
+
+    def save_rdb(self, filename, t=None, error=None, units='ms',
+                 overwrite=False):
+        """ 
+        Save one sample at times `t` to a text .rdb file. If the file exists
+        and not `overwrite`, a FileExistsError is raised. For many 
+        realizations, `save_realizations` is much faster.
+        """
+        if t is None:
+            t = self._get_t()
+
+        if os.path.exists(filename) and not overwrite:
+            raise FileExistsError('File "%s" exists, use overwrite=True to '
+                                  'replace it.' % filename)
 
         if error is None:
             if not hasattr(self, 'components'):
@@ -94,48 +359,224 @@ class Component(object):
         else:
             raise ValueError('Units %s unrecognized, try "ms" or "kms".' % units)
 
-        if isinstance(sample, tuple):
-            X = list(zip(sample[0], sample[1]*f, error*f))
-        else:
-            X = list(zip(self.sampling.time, sample*f, error*f))
-
+        X = np.column_stack([t, sample*f, error*f])
         np.savetxt(filename, X=X, header=header, fmt=fmt, comments='',)
 
 
-class Sum(Component):
+class StochasticComponent(Component):
+    """
+    A Gaussian stochastic signal described by its power spectral density, 
+    simulated with one of `methods`:
+      'fft': from the PSD on a uniform frequency grid up to the Nyquist 
+        frequency of the minimum time spacing;
+      'interpolate': from the PSD on a grid which only goes up to the 
+        frequency below which all but a fraction `grid_tolerance` of the 
+        power lies (and at most to the Nyquist frequency of 
+        `grid_resolution` days, with at most `max_grid_size` points); the 
+        series is interpolated at the actual times and the missing power 
+        is added as white noise (with a warning if it is well above 
+        `grid_tolerance` of the variance, as when the grid stops below the
+        frequencies of an oscillation);
+      'celerite': exactly at the actual times, in O(N), for PSDs with a 
+        celerite representation (see `celerite_terms`);
+      'cholesky': exactly at the actual times, for any PSD, from the 
+        (cached) Cholesky factor of the covariance matrix, in O(N^2) per 
+        realization after an O(N^3) factorisation.
+    Subclasses provide `_psd`, `_variance`, `_bandwidth`, `covariance`, 
+    `celerite_terms` and `_psd_key`, the parameters the PSD depends on.
+    """
+    gaussian = True
+    methods = ('fft', 'interpolate', 'celerite', 'cholesky')
+
+    def _init_method(self, method, grid_tolerance, grid_resolution, 
+                     max_grid_size):
+        assert method in self.methods, \
+            '%s `method` should be one of %s' % (type(self).__name__, 
+                                                 self.methods)
+        self.method = method
+        self.grid_tolerance = grid_tolerance
+        self.grid_resolution = grid_resolution
+        self.max_grid_size = max_grid_size
+        self._psd_cache = LRUCache(maxsize=8, maxbytes=cache_maxbytes)
+
+    def _psd_key(self):
+        raise NotImplementedError
+
+    def _get_interpolation_grid(self, t):
+        key = ('interpolate', array_key(t), self.grid_tolerance, 
+               self.grid_resolution, self.max_grid_size) + self._psd_key()
+        grid = self._psd_cache.get(key)
+        if grid is None:
+            nu = interpolation_grid(t, self._bandwidth(self.grid_tolerance),
+                                    self.grid_resolution, self.max_grid_size)
+            power = self._psd(nu)
+            represented = (power.sum() - power[0] / 2) * nu[1]
+            missing = max(self._variance() - represented, 0.)
+            # by construction, the tail beyond the grid holds up to a 
+            # fraction grid_tolerance of the power; allow as much again for
+            # the discretisation of the PSD
+            if missing > 2 * self.grid_tolerance * self._variance():
+                warnings.warn('the frequency grid of %s only holds %.1f%% of '
+                              'its power, the rest is added as white noise; '
+                              'increase `max_grid_size` or use another '
+                              '`method`'
+                              % (type(self).__name__, 
+                                 100 * (1 - missing / self._variance())))
+            grid = self._psd_cache[key] = (nu, power, missing)
+        return grid
+
+    def grid_size(self, t=None):
+        """ Number of frequencies used to simulate the signal at times `t`
+        (0 for method='celerite' or 'cholesky') """
+        if t is None:
+            t = self._get_t()
+        t = as_days(t)
+        if self.method in ('celerite', 'cholesky'):
+            return 0
+        if self.method == 'interpolate':
+            return self._get_interpolation_grid(t)[0].size
+        return frequency_grid(t)[1].size
+
+    def _get_cached_psd(self, grid_key, nu):
+        # the PSD only needs to be re-evaluated if the frequency grid or the 
+        # parameters change
+        key = (grid_key, ) + self._psd_key()
+        power = self._psd_cache.get(key)
+        if power is None:
+            power = self._psd_cache[key] = self._psd(nu)
+        return power
+
+    def _sample(self, t, size, change_random_state):
+        if t is None:
+            t = self._get_t()
+        t = as_days(t)
+
+        if self.method == 'celerite':
+            rng = self._get_rng(change_random_state)
+            return _celerite.sample(t, self.celerite_terms(), size, rng)
+        if self.method == 'cholesky':
+            rng = self._get_rng(change_random_state)
+            return self._sample_cholesky(t, size, rng)
+        if self.method == 'interpolate':
+            nu, power, missing = self._get_interpolation_grid(t)
+            rng = self._get_rng(change_random_state)
+            return timeseries_from_psd_interpolated(nu, power, t, size, rng,
+                                                    missing)
+
+        grid_key, nu = frequency_grid(t)
+        power = self._get_cached_psd(grid_key, nu)
+        rng = self._get_rng(change_random_state)
+        return timeseries_from_psd(nu, power, t, size, rng)
+
+    def sample(self, t=None, change_random_state=False):
+        return self._sample(t, None, change_random_state)
+
+    def sample_many(self, n, t=None, change_random_state=False):
+        """ `n` realizations at times `t`, as an array of shape (n, t.size) """
+        return self._sample(t, n, change_random_state)
+
+
+class Model(Component):
+    """ 
+    A sum of components, e.g. Planet(...) + Granulation(...) + WhiteNoise().
+    The components are kept in a flat list and their samples are accumulated
+    into a single output array. The individual samples from the last call to
+    `sample` are available in `contributions`, in the same order as 
+    `components`.
+    """
     def __init__(self, *args):
-        super(Sum, self).__init__()
-        for i, c in enumerate(args):
-            setattr(self, 'c%d' % (i+1), c)
+        super(Model, self).__init__()
+        self.components = []
+        for c in args:
+            if isinstance(c, Model):
+                self.components.extend(c.components)
+            else:
+                self.components.append(c)
+        self.contributions = None
 
     def __repr__(self):
-        return "{0} \n+ {1}".format(self.c1, self.c2)
-
-    @property
-    def components(self):
-        c = []
-        c.append(self.c2)
-        cdot = 'c1'
-        while hasattr(deepgetattr(self, cdot), 'components'):
-            att = deepgetattr(self, cdot+'.c2')
-            c.append(att)
-            cdot += '.c1'
-        else:
-            att = deepgetattr(self, cdot)
-            c.append(att)
+        return " \n+ ".join(map(repr, self.components))
+
+    def __add__(self, b):
+        return Model(self, b)
+    def __radd__(self, b):
+        if isinstance(b, int) and b == 0: # to allow sum([c1, c2, ...])
+            return self
+        return Model(b, self)
+
+    def memoize(self, maxsize=16):
+        """ Cache the samples of each of the components (the sum itself is 
+        cheap to recompute, see Component.memoize) """
+        for c in self.components:
+            c.memoize(maxsize)
 
-        return c
+    def covariance(self, tau):
+        return sum(c.covariance(tau) for c in self.components)
+
+    def _covariance_key(self):
+        return tuple(c._covariance_key() for c in self.components)
+
+    def _covariance_matrix(self, t):
+        C = np.zeros((t.size, t.size))
+        for c in self.components:
+            C += c._covariance_matrix(t)
+        return C
+
+    @staticmethod
+    def _accumulate(samples):
+        # components can return (n_times, ) or, for grids of planets, 
+        # (n_times, n_orbits) arrays; the sum has the shape of the largest
+        ndim = max(np.ndim(y) for y in samples)
+        columns = [np.reshape(y, np.shape(y) + (1,) * (ndim - np.ndim(y)))
+                   for y in samples]
+        out = np.zeros(np.broadcast_shapes(*[c.shape for c in columns]))
+        for c in columns:
+            np.add(out, c, out=out)
+        return out
 
     def sample(self, t=None, change_random_state=False):
         if t is None:
             t = self._get_t()
 
-        # s1 = self.c1.sample(t)
-        # s2 = self.c2.sample(t)
-        # return self.c1.sample(t) + self.c2.sample(t)
-        return np.vstack(self.c1.sample(t, change_random_state)) \
-               + np.vstack(self.c2.sample(t, change_random_state))
-        # return np.hstack(np.hsplit(self.c1.sample(t), 4) + np.hsplit(self.c2.sample(t), 2))
+        self.contributions = [c.sample(t, change_random_state)
+                              for c in self.components]
+        return self._accumulate(self.contributions)
+
+    def sample_many(self, n, t=None, change_random_state=False,
+                    method='components', disk_cache=False):
+        """
+        `n` realizations at times `t`, as an array of shape (n, t.size). 
+        With method='components', each component is sampled on its own. 
+        With method='cholesky', all the Gaussian components (WhiteNoise, 
+        Granulation, Oscillation) are drawn together, exactly at the times 
+        `t`, from the Cholesky factor of their total covariance (see 
+        `cholesky`, which caches it), using the random stream of the first 
+        of them. The other components are sampled on their own.
+        """
+        if t is None:
+            t = self._get_t()
+
+        if method == 'components':
+            return self._accumulate([c.sample_many(n, t, change_random_state)
+                                     for c in self.components])
+        elif method != 'cholesky':
+            raise ValueError('method should be "components" or "cholesky"')
+
+        stochastic = [c for c in self.components if c.gaussian]
+        others = [c.sample_many(n, t, change_random_state)
+                  for c in self.components if c not in stochastic]
+        if not stochastic:
+            return self._accumulate(others)
+        rng = stochastic[0]._get_rng(change_random_state)
+        noise = Model(*stochastic)._sample_cholesky(as_days(t), n, rng,
+                                                    disk_cache)
+        return self._accumulate(others + [noise])
+
+    def _sample_many_parts(self, n, t, change_random_state):
+        parts = [c.sample_many(n, t, change_random_state)
+                 for c in self.components]
+        names = ['component%d' % i for i in range(len(parts))]
+        return self._accumulate(parts), dict(zip(names, parts))
 
     def plots(self, t=None, ntt=None):
         if t is None:
@@ -153,17 +594,21 @@ class Sum(Component):
                 pass
 
         if ntt is None:
-            ntt = int(50 * t.ptp() / Pmin)
+            ntt = int(50 * np.ptp(t) / Pmin)
             if ntt == 0:
                 ntt = 1000
             ntt = min(10000, ntt)
         tt = np.linspace(t.min(), t.max(), ntt)
 
         fig, axes = plt.subplots(2, 1)
-        axes[0].plot(tt, self.sample(tt), 'r', lw=1, alpha=0.3)
         axes[0].plot(t, self.sample(t), '-ok', lw=2)
+        axes[0].plot(tt, self.sample(tt), 'r', lw=1, alpha=0.3)
 
-        for c in self.components:
-            axes[1].plot(tt, c.sample(tt), '-', alpha=0.5, label=c.__repr__())
+        for c, y in zip(self.components, self.contributions):
+            axes[1].plot(tt, y, '-', alpha=0.5, label=c.__repr__())
         axes[1].legend()
         plt.show()
+
+
+# for backwards compatibility
+Sum = Model
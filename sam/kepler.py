@@ -1,53 +1,94 @@
 """ Code adapted from github.com/California-Planet-Search/radvel """
-__all__ = ['rv_curve']
+__all__ = ['rv_curve', 'rv_curve_grid', 'rv_curve_sum', 'rv_curve_jacobian',
+           'set_backend', 
+           'OrbitBatch', 'Workspace', 'EccentricAnomalyTable']
 
+import os
+import warnings
+from functools import partial
 import numpy as np
 
-# # Try to import Kepler's equation solver written in C
-# try:
-#     from . import _kepler 
-#     cext = True
-# except ImportError:
-#     print "WARNING (kepler.py)"
-#     print "Cannot import C-based Kepler's equation solver."
-#     print "Falling back to the slower numpy implementation."
-#     cext = False
-
-def rv_curve(t, orbel):#, cext=cext):
+from .utils import save_array
+
+# Try to import Kepler's equation solver written in C
+try:
+    from . import _kepler
+    cext = True
+except ImportError:
+    cext = False
+    with warnings.catch_warnings():
+        warnings.simplefilter("module")
+        warnings.warn("Cannot import C-based Kepler's equation solver. "
+                      "Falling back to the slower numpy implementation.",
+                      ImportWarning)
+
+# eccentricity below which grids use a series starting guess for E
+low_ecc = 0.1
+
+# approximate number of (time, orbit) values evaluated at once by rv_curve_sum
+sum_block_elements = 2**16
+
+backends = ('c', 'numpy')
+backend = 'c' if cext else 'numpy'
+
+
+def set_backend(name):
+    """Select the default backend used by `rv_curve`, 'c' or 'numpy'"""
+    global backend
+    backend = _check_backend(name)
+
+
+def _check_backend(name):
+    if name is None:
+        return backend
+    if name not in backends:
+        raise ValueError('Unknown backend "%s", try one of %s' % (name, backends))
+    if name == 'c' and not cext:
+        raise ValueError('The C-based Kepler solver is not available, '
+                         'reinstall SAM with Cython and numpy to build it.')
+    return name
+
+
+def rv_curve(t, orbel, backend=None, solver='iterative', workspace=None):
     """RV Drive
     
     Args:
         t (array): times of observations
-        orbel (array): [per, tp, e, om, K].
+        orbel (array): [per, k, e, om, tp], a list of such arrays, one
+              for each orbit in a grid, or an `OrbitBatch`. 
               om is expected to be in radians
+        backend (str): 'c' or 'numpy'. By default, use the C solver if it
+              is available (see `set_backend`)
+        solver (str): 'iterative', or 'table' to solve Kepler's equation
+              with the tabulated solver (see `EccentricAnomalyTable`); 
+              'table' always uses the numpy backend
+        workspace (Workspace): preallocated arrays for evaluating an 
+              `OrbitBatch` at times `t`, which must be `workspace.t`.
+              With a workspace, nothing is allocated and the returned
+              array is `workspace.rv`, which is overwritten by the next
+              call
     Returns:
-        rv: (array): radial velocity curve
+        rv: (array): radial velocity curve, with shape (n_times, n_orbits)
+              for a grid of orbits
     """
-    
-    t = np.atleast_1d(t).astype(np.float)
+    if workspace is not None:
+        if t is not workspace.t and \
+                not np.array_equal(np.atleast_1d(t), workspace.t):
+            raise ValueError('times `t` differ from those of the workspace')
+        return workspace.rv_curve(orbel)
+
+    backend = _check_backend(backend)
+    t = np.ascontiguousarray(np.atleast_1d(t), dtype=float)
 
     ## multiple planets?
-    multi = any([isinstance(p,list) for p in orbel]) or \
+    multi = isinstance(orbel, OrbitBatch) or \
+            any([isinstance(p,list) for p in orbel]) or \
             any([isinstance(p,np.ndarray) for p in orbel])
 
     if multi: 
-        orbel = np.array([np.atleast_1d(p).astype(np.float) for p in orbel]).T
-        # multi_per, multi_k, multi_e, multi_om, multi_tp = orbel
-
-        # Error checking
-        orbel[0][orbel[0]<0] = 1e-4
-        orbel[2][orbel[2]<0] = 0.
-        orbel[2][orbel[2]>0.99] = 0.99
-
-        rv = np.zeros((t.size, len(orbel[0])))
-        for i, (per,k,e,om,tp) in enumerate(np.array(orbel).T):
-            M = 2 * np.pi * ( ((t - tp) / per) - np.floor( (t - tp) / per ) )
-            eccarr = np.zeros(t.size) + e
-            E1 = kepler(M, eccarr)
-            # Calculate nu
-            nu = 2 * np.arctan( ( (1+e) / (1-e) )**0.5 * np.tan( E1 / 2 ) )
-            # Calculate the radial velocity
-            rv[:,i] = k * ( np.cos( nu + om ) + e * np.cos( om ) ) 
+        if not isinstance(orbel, OrbitBatch):
+            orbel = OrbitBatch.from_orbel(orbel)
+        rv = rv_curve_grid(t, *orbel, backend=backend, solver=solver)
 
     else:
         per, k, e, om, tp = orbel
@@ -61,9 +102,12 @@ def rv_curve(t, orbel):#, cext=cext):
         if e < 0: e = 0
         if e > 0.99: e = 0.99
 
+        if backend == 'c' and solver == 'iterative':
+            return _kepler.rv_curve_array(t, per, tp, e, om, k)
+
         M = 2 * np.pi * ( ((t - tp) / per) - np.floor( (t - tp) / per ) )
         eccarr = np.zeros(t.size) + e
-        E1 = kepler(M, eccarr)
+        E1 = _solve(M, eccarr, solver)
         # Calculate nu
         nu = 2 * np.arctan( ( (1+e) / (1-e) )**0.5 * np.tan( E1 / 2 ) )
         # Calculate the radial velocity
@@ -71,38 +115,351 @@ def rv_curve(t, orbel):#, cext=cext):
     
     return rv
 
-def kepler(inbigM, inecc):
+def rv_curve_grid(t, per, k, e, om, tp, backend=None, solver='iterative'):
+    """RV Drive for a grid of orbits
+
+    Solves Kepler's equation for all (time, orbit) pairs in one pass, 
+    broadcasting the times against the orbital parameters. Orbits are 
+    dispatched according to their eccentricity: circular orbits use the 
+    analytic cosine, orbits with e <= `low_ecc` start the solver from a 
+    series expansion of E (usually converging in one step), and only the 
+    remaining orbits pay for the full solution (iterative or tabulated).
+
+    Args:
+        t (array): times of observations, shape (n_times,)
+        per, k, e, om, tp (arrays): orbital parameters, shape (n_orbits,).
+              om is expected to be in radians
+        backend (str): 'c' or 'numpy' (see `set_backend`)
+        solver (str): 'iterative' or 'table' (see `rv_curve`)
+    Returns:
+        rv: (array): radial velocity curves, shape (n_times, n_orbits)
+    """
+    backend = _check_backend(backend)
+    t = np.ascontiguousarray(np.atleast_1d(t), dtype=float)
+    per, k, e, om, tp = OrbitBatch(per, k, e, om, tp)
+
+    circular = e == 0.
+    if backend == 'c' and solver == 'iterative':
+        groups = [(circular, _rv_circular), (~circular, _rv_cext)]
+    else:
+        low = ~circular & (e <= low_ecc)
+        groups = [(circular, _rv_circular), 
+                  (low, partial(_rv_eccentric, series_start=True)),
+                  (e > low_ecc, partial(_rv_eccentric, solver=solver))]
+
+    rv = None
+    for mask, func in groups:
+        if mask.all():  # no need to split the grid
+            return func(t, per, k, e, om, tp)
+        if mask.any():
+            if rv is None:
+                rv = np.empty((t.size, per.size))
+            rv[:, mask] = func(t, per[mask], k[mask], e[mask], om[mask], tp[mask])
+    return rv
+
+
+def rv_curve_sum(t, per, k, e, om, tp, backend=None, out=None):
+    """RV Drive for a system of orbits
+
+    The sum of the RV curves of all orbits (e.g. the planets in a system),
+    accumulated in a single buffer. The C backend does one pass over the 
+    times, summing all orbits at each time; the numpy backend evaluates 
+    blocks of times for all orbits at once (with `rv_curve_grid`) and sums
+    each block, so the full (n_times, n_orbits) array is never built.
+
+    Args:
+        t (array): times of observations, shape (n_times,)
+        per, k, e, om, tp (arrays): orbital parameters, shape (n_orbits,)
+        backend (str): 'c' or 'numpy' (see `set_backend`)
+        out (array, optional): write the result into this array
+    Returns:
+        rv: (array): total radial velocity, shape (n_times,)
+    """
+    backend = _check_backend(backend)
+    t = np.ascontiguousarray(np.atleast_1d(t), dtype=float)
+    batch = OrbitBatch(per, k, e, om, tp)
+    if out is None:
+        out = np.empty(t.size)
+    elif out.shape != t.shape:
+        raise ValueError('`out` should have shape %s' % (t.shape, ))
+
+    if backend == 'c':
+        _kepler.rv_curve_sum_array(t, batch.per, batch.tp, batch.e,
+                                   batch.om, batch.k, out)
+        return out
+
+    block = max(1, sum_block_elements // len(batch))
+    for start in range(0, t.size, block):
+        rv = rv_curve_grid(t[start:start + block], *batch, backend=backend)
+        rv.sum(axis=1, out=out[start:start + block])
+    return out
+
+
+def rv_curve_jacobian(t, orbel, solver='iterative'):
+    """RV Drive, with derivatives
+
+    The RV curve and its analytic derivatives with respect to the orbital 
+    parameters [per, k, e, om, tp], from the same solution of Kepler's 
+    equation. With the true anomaly nu, 
+        drv/dnu = -k sin(nu + om),
+        dnu/dM = (1 + e cos nu)^2 / (1 - e^2)^(3/2),
+        dnu/de (at fixed M) = sin nu (2 + e cos nu) / (1 - e^2),
+    and M = 2 pi (t - tp) / per. Always uses the numpy backend.
+
+    Args:
+        t (array): times of observations
+        orbel (array): [per, k, e, om, tp], a list of such arrays or an
+              `OrbitBatch`, as in `rv_curve`
+        solver (str): 'iterative' or 'table' (see `rv_curve`)
+    Returns:
+        rv: (array): radial velocity curve, shape (n_times,) for one orbit
+              or (n_times, n_orbits) for several
+        jac: (array): derivatives, with the same shape as rv plus a last 
+              axis with the 5 parameters in the order [per, k, e, om, tp]
+    """
+    t = np.ascontiguousarray(np.atleast_1d(t), dtype=float)
+    single = not (isinstance(orbel, OrbitBatch) or
+                  any([isinstance(p, (list, np.ndarray)) for p in orbel]))
+    if isinstance(orbel, OrbitBatch):
+        batch = orbel
+    elif single:
+        batch = OrbitBatch(*orbel)
+    else:
+        batch = OrbitBatch.from_orbel(orbel)
+    per, k, e, om, tp = batch
+
+    M = _mean_anomaly(t, per, tp)
+    E = _solve(M, np.broadcast_to(e, M.shape), solver)
+    nu = 2 * np.arctan( batch.ecc_factor * np.tan( E / 2 ) )
+    cosnu, sinnu = np.cos(nu), np.sin(nu)
+    cos_nuom = np.cos(nu + om)
+
+    rv = k * cos_nuom + batch.ke_cosom
+    drv_dnu = -k * np.sin(nu + om)
+    one_e2 = 1 - e**2
+    dnu_dM = (1 + e * cosnu)**2 / one_e2**1.5
+    dnu_de = sinnu * (2 + e * cosnu) / one_e2
+
+    jac = np.empty(rv.shape + (5, ))
+    jac[..., 0] = drv_dnu * dnu_dM * (-2 * np.pi * (t[:, np.newaxis] - tp) / per**2)
+    jac[..., 1] = cos_nuom + e * np.cos(om)
+    jac[..., 2] = k * np.cos(om) + drv_dnu * dnu_de
+    jac[..., 3] = drv_dnu - k * e * np.sin(om)
+    jac[..., 4] = drv_dnu * dnu_dM * (-2 * np.pi / per)
+
+    if single:
+        return rv[:, 0], jac[:, 0]
+    return rv, jac
+
+
+class OrbitBatch(object):
+    """
+    Orbital parameters of a batch of orbits, validated once and stored as 
+    one contiguous float64 array with rows [per, k, e, om, tp]. 
+    Unpacks as `per, k, e, om, tp = batch`.
+    """
+    def __init__(self, per, k, e, om, tp):
+        per, k, e, om, tp = np.broadcast_arrays(
+            *[np.atleast_1d(p) for p in (per, k, e, om, tp)])
+        self.data = np.array([per, k, e, om, tp], dtype=float)
+        self.per, self.k, self.e, self.om, self.tp = self.data
+
+        # Error checking (on our own copy of the parameters)
+        self.per[self.per < 0] = 1e-4
+        np.clip(self.e, 0., 0.99, out=self.e)
+
+        # quantities which don't depend on time
+        self.ecc_factor = np.sqrt((1 + self.e) / (1 - self.e))
+        self.ke_cosom = self.k * self.e * np.cos(self.om)
+
+    @classmethod
+    def from_orbel(cls, orbel):
+        """ From a list of [per, k, e, om, tp] arrays, one for each orbit """
+        return cls(*np.array([np.atleast_1d(p) for p in orbel], dtype=float).T)
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __repr__(self):
+        return "OrbitBatch(%d orbits)" % len(self)
+
+
+class Workspace(object):
+    """
+    Preallocated arrays to evaluate the RV curves of an `OrbitBatch` with 
+    `size` orbits at fixed times `t`, for repeated calls which allocate 
+    no memory (e.g. in an MCMC). Use as rv_curve(t, batch, workspace=ws).
+    """
+    def __init__(self, t, size):
+        self.t = np.ascontiguousarray(np.atleast_1d(t), dtype=float)
+        self.shape = (self.t.size, size)
+        self.M, self.E, self.rv = [np.empty(self.shape) for _ in range(3)]
+        self.work = [np.empty(self.shape) for _ in range(4)]
+
+    def __repr__(self):
+        return "Workspace(%d times, %d orbits)" % self.shape
+
+    def rv_curve(self, batch, maxiter=30):
+        """ RV curves of the orbits in `batch`, written to self.rv """
+        if (self.t.size, len(batch)) != self.shape:
+            raise ValueError('batch with %d orbits does not match this '
+                             'workspace, with %d' % (len(batch), self.shape[1]))
+        M, E, rv = self.M, self.E, self.rv
+        w1, w2, w3, w4 = self.work
+        ecc = batch.e
+
+        # mean anomaly
+        np.subtract(self.t[:, np.newaxis], batch.tp, out=M)
+        np.divide(M, batch.per, out=M)
+        np.floor(M, out=w1)
+        np.subtract(M, w1, out=M)
+        np.multiply(M, 2 * np.pi, out=M)
+
+        # first guess at E, then third-order corrections on the whole array
+        np.sin(M, out=w1)
+        np.sign(w1, out=w1)
+        np.multiply(w1, 0.85 * ecc, out=w1)
+        np.add(M, w1, out=E)
+        for _ in range(maxiter):
+            np.sin(E, out=w1)
+            np.multiply(ecc, w1, out=w2)
+            np.subtract(E, w2, out=w2)
+            np.subtract(w2, M, out=w2)  # fi
+            np.abs(w2, out=w3)
+            if w3.max() <= 1.0e-12:
+                break
+            np.cos(E, out=w3)
+            np.multiply(ecc, w3, out=w3)
+            np.subtract(1, w3, out=w3)  # fip
+            np.multiply(ecc, w1, out=w1)  # fipp
+            np.divide(w2, w3, out=w4)  # -d1
+            np.multiply(w4, w1, out=w4)
+            np.multiply(w4, -0.5, out=w4)
+            np.add(w4, w3, out=w4)
+            np.divide(w2, w4, out=w4)  # -d2
+            np.multiply(w1, w4, out=w1)
+            np.multiply(w1, -0.5, out=w1)
+            np.add(w1, w3, out=w1)
+            np.multiply(w4, w4, out=w4)
+            np.subtract(1, w3, out=w3)  # fippp
+            np.multiply(w4, w3, out=w4)
+            np.divide(w4, 6.0, out=w4)
+            np.add(w1, w4, out=w1)
+            np.divide(w2, w1, out=w2)  # -d3
+            np.subtract(E, w2, out=E)
+
+        # true anomaly and radial velocity
+        np.divide(E, 2, out=E)
+        np.tan(E, out=E)
+        np.multiply(E, batch.ecc_factor, out=E)
+        np.arctan(E, out=E)
+        np.multiply(E, 2, out=E)
+        np.add(E, batch.om, out=E)
+        np.cos(E, out=rv)
+        np.multiply(rv, batch.k, out=rv)
+        np.add(rv, batch.ke_cosom, out=rv)
+        return rv
+
+
+def _mean_anomaly(t, per, tp):
+    phase = (t[:, np.newaxis] - tp) / per
+    return 2 * np.pi * ( phase - np.floor(phase) )
+
+
+def _rv_circular(t, per, k, e, om, tp):
+    M = _mean_anomaly(t, per, tp)
+    return k * np.cos( M + om )
+
+
+def _rv_cext(t, per, k, e, om, tp):
+    return _kepler.rv_curve_multi_array(t, per, tp, e, om, k)
+
+
+def _rv_eccentric(t, per, k, e, om, tp, series_start=False,
+                  solver='iterative'):
+    M = _mean_anomaly(t, per, tp)
+    eccarr = np.broadcast_to(e, M.shape)
+    if series_start:
+        # second-order series in e, followed by one third-order correction 
+        # applied to all elements at once; `kepler` then only checks 
+        # convergence (and iterates on the rare stragglers)
+        E0 = M + e * np.sin(M) * (1 + e * np.cos(M))
+        E0 += _kepler_step(M, eccarr, E0)
+        E1 = kepler(M, eccarr, E0)
+    else:
+        E1 = _solve(M, eccarr, solver)
+    # Calculate nu
+    nu = 2 * np.arctan( ( (1+e) / (1-e) )**0.5 * np.tan( E1 / 2 ) )
+    # Calculate the radial velocity
+    return k * ( np.cos( nu + om ) + e * np.cos( om ) )
+
+
+def _solve(M, ecc, solver):
+    if solver == 'iterative':
+        return kepler(M, ecc)
+    elif solver == 'table':
+        return get_table()(M, ecc)
+    raise ValueError('Unknown solver "%s", try "iterative" or "table"' % solver)
+
+
+def _kepler_step(M, ecc, E):
+    """ Third-order correction to E in the solution of Kepler's equation """
+    sinE = np.sin(E)
+    fi = E - ecc * sinE - M  # should go to 0
+    fip = 1 - ecc * np.cos(E)  # first derivative of fi
+    fipp = ecc * sinE  # second derivative of fi
+    fippp = 1 - fip  # third derivative of fi
+    d1 = -fi / fip
+    d2 = -fi / (fip + d1 * fipp / 2.0)
+    return -fi / (fip + d2 * fipp / 2.0 + d2 * d2 * fippp / 6.0)
+
+
+def kepler(inbigM, inecc, E0=None):
     """Solve Kepler's Equation
 
+    Works element-wise on arrays of any shape (e.g. the 2-D time x orbit 
+    arrays used by `rv_curve_grid`). Only the elements that have not yet 
+    converged are updated in each iteration.
+
     Args:
         inbigM (array): input Mean annomaly
-        inecc (array): eccentricity
+        inecc (array): eccentricity, broadcastable to the shape of inbigM
+        E0 (array, optional): starting guess for the eccentric anomaly
 
     Returns:
-        eccentric annomaly: array
+        eccentric annomaly: array, or a scalar for a scalar inbigM
     
     """
     
-    Marr = inbigM  # protect inputs; necessary?
-    eccarr = inecc
+    # at least 1-d, so that the flat arrays below are views, not copies
+    Marr = np.atleast_1d(np.asarray(inbigM, dtype=float))
+    eccarr = np.broadcast_to(inecc, Marr.shape)
     conv = 1.0e-12  # convergence criterion
     k = 0.85
 
-    Earr = Marr + np.sign(np.sin(Marr)) * k * eccarr  # first guess at E
+    if E0 is None:
+        Earr = Marr + np.sign(np.sin(Marr)) * k * eccarr  # first guess at E
+    else:
+        Earr = np.array(E0, dtype=float, ndmin=1)
     # fiarr should go to zero when converges
-    fiarr = ( Earr - eccarr * np.sin(Earr) - Marr)  
-    convd = np.abs(fiarr) > conv  # which indices have not converged
-    nd = np.sum(convd == True) # number of converged elements
+    fiarr = ( Earr - eccarr * np.sin(Earr) - Marr)
+
+    # work on flat views, keeping the indices of unconverged elements
+    Eflat, Mflat, eccflat = Earr.ravel(), Marr.ravel(), eccarr.ravel()
+    idx = np.flatnonzero(np.abs(fiarr) > conv)
+    fi = fiarr.ravel()[idx]
     count = 0
 
-    while nd > 0:  # while unconverged elements exist
+    while idx.size > 0:  # while unconverged elements exist
         count += 1
         
-        # M = Marr[convd]  # just the unconverged elements ...
-        ecc = eccarr[convd]
-        E = Earr[convd]
+        ecc = eccflat[idx]
+        E = Eflat[idx]
 
-        fi = fiarr[convd]  # fi = E - e*np.sin(E)-M    ; should go to 0
+        # fi = E - e*np.sin(E)-M    ; should go to 0
         fip = 1 - ecc * np.cos(E) # d/dE(fi) ;i.e.,  fi^(prime)
         fipp = ecc * np.sin(E) # d/dE(d/dE(fi)) ;i.e.,  fi^(\prime\prime)
         fippp = 1 - fip  # d/dE(d/dE(d/dE(fi))) ;i.e.,  fi^(\prime\prime\prime)
@@ -112,13 +469,88 @@ def kepler(inbigM, inecc):
         d2 = -fi / (fip + d1 * fipp / 2.0)
         d3 = -fi / (fip + d2 * fipp/ 2.0 + d2 * d2 * fippp / 6.0) 
         E = E + d3
-        Earr[convd] = E
-        fiarr = ( Earr - eccarr * np.sin( Earr ) - Marr) # how well did we do?
-        convd = np.abs(fiarr) > conv  #test for convergence
-        nd = np.sum(convd == True)
+        Eflat[idx] = E
+        fi = ( E - ecc * np.sin( E ) - Mflat[idx]) # how well did we do?
+        notconvd = np.abs(fi) > conv  #test for convergence
+        idx, fi = idx[notconvd], fi[notconvd]
         
-    if Earr.size > 1: 
-        return Earr
-    else: 
-        return Earr[0]
+    if np.ndim(inbigM) == 0 and Earr.size == 1:
+        return Earr.flat[0]
+    return Earr
+
+
+def _cache_dir():
+    return os.environ.get('SAM_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'sam'))
+
+
+class EccentricAnomalyTable(object):
+    """
+    Tabulated solution E(M, e) of Kepler's equation on a regular grid of 
+    mean anomalies in [0, 2pi] and eccentricities in [0, emax].
+
+    The table is computed once with `kepler` and saved in the cache 
+    directory (SAM_CACHE_DIR, by default ~/.cache/sam), from where other 
+    processes memory-map it. Values are bilinearly interpolated and then 
+    polished with one third-order correction; any element whose residual 
+    |E - e sin(E) - M| is still above the 1e-12 tolerance of the iterative 
+    solver is passed on to `kepler`, so results have the same error bound.
+
+    Since the residual is always checked, the table saves only part of the
+    iterations: on large grids it is at most ~1.2x faster than the iterative
+    solver (and about as fast for e ~ 0.6). Grids only use it for orbits 
+    with e > `low_ecc`, the others converge faster from a series guess.
+    """
+    def __init__(self, nM=1024, ne=128, emax=0.99, cache=True):
+        self.nM, self.ne, self.emax = nM, ne, emax
+        self.dM = 2 * np.pi / (nM - 1)
+        self.de = emax / (ne - 1)
+
+        filename = os.path.join(_cache_dir(), 
+                                'kepler_table_%dx%d_%g.npy' % (nM, ne, emax))
+        if cache and os.path.exists(filename):
+            self.table = np.load(filename, mmap_mode='r')
+        else:
+            self.table = self._compute()
+            if cache:
+                save_array(filename, self.table, 'Kepler table')
+
+    def __repr__(self):
+        return "EccentricAnomalyTable(nM=%d, ne=%d, emax=%g)" % \
+            (self.nM, self.ne, self.emax)
+
+    def _compute(self):
+        M = np.linspace(0, 2 * np.pi, self.nM)
+        e = np.linspace(0, self.emax, self.ne)
+        return kepler(*np.meshgrid(M, e, indexing='ij'))
+
+    def __call__(self, M, ecc):
+        """ Eccentric anomaly for mean anomaly `M` and eccentricity `ecc` """
+        M = np.asarray(M, dtype=float)
+        ecc = np.broadcast_to(ecc, M.shape)
+        if np.any(ecc > self.emax):
+            raise ValueError('eccentricity above the table limit (%g)' % self.emax)
+
+        # the table covers one period of M
+        Mred = np.mod(M, 2 * np.pi)
+        x, y = Mred / self.dM, ecc / self.de
+        i = np.minimum(x.astype(int), self.nM - 2)
+        j = np.minimum(y.astype(int), self.ne - 2)
+        x, y = x - i, y - j
+
+        table = self.table
+        E = (1 - x) * ((1 - y) * table[i, j] + y * table[i, j + 1]) \
+            + x * ((1 - y) * table[i + 1, j] + y * table[i + 1, j + 1])
+        E += _kepler_step(Mred, ecc, E)
+        E = kepler(Mred, ecc, E)
+        return E + (M - Mred)
+
+
+_tables = {}
 
+def get_table(**kwargs):
+    """ Get a (shared) EccentricAnomalyTable, creating it if needed """
+    key = tuple(sorted(kwargs.items()))
+    if key not in _tables:
+        _tables[key] = EccentricAnomalyTable(**kwargs)
+    return _tables[key]
@@ -1,5 +1,13 @@
+from collections import OrderedDict
+import os
+import hashlib
+import warnings
 import numpy as np
-from astropy.stats import LombScargle
+from scipy.fft import next_fast_len
+try:
+    from astropy.timeseries import LombScargle
+except ImportError:  # astropy < 3.2
+    from astropy.stats import LombScargle
 
 from . import units
 
@@ -15,9 +23,140 @@ def _pprints(values):
     return list(map(_pprint, values))
 
 
+class LRUCache(object):
+    """ A dictionary-like cache which keeps the `maxsize` most recently used 
+    items and, if `maxbytes` is given, at most that many bytes of arrays
+    (items larger than `maxbytes` are not kept at all) """
+    def __init__(self, maxsize=32, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+
+    def __repr__(self):
+        return "LRUCache(%d/%d items)" % (len(self), self.maxsize)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._data:
+            self._pop(key)
+        size = _nbytes(value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self._data[key] = value
+        self._sizes[key] = size
+        self.nbytes += size
+        while len(self._data) > self.maxsize or \
+                (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        self.nbytes -= self._sizes.pop(key)
+        return self._data.pop(key)
+
+    def pop(self, key, default=None):
+        if key in self._data:
+            return self._pop(key)
+        return default
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        self._data.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+
+def _nbytes(value):
+    """ Size of the arrays in `value` (an array or a tuple of them) """
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+
+def array_key(a):
+    """ A hashable key identifying the contents of array `a` """
+    a = np.ascontiguousarray(getattr(a, 'value', a))
+    digest = hashlib.sha1(a.view(np.uint8)).hexdigest()
+    return (a.shape, a.dtype.str, digest)
+
+
+def save_array(filename, array, description='array'):
+    """ 
+    Save `array` to the .npy file `filename`, creating its directory. The 
+    file is written under a temporary name first and then renamed, so that 
+    other processes never read it half-written. Failures only give a 
+    warning, naming the `description` of what was being saved.
+    """
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, filename)
+    except OSError:
+        warnings.warn('Could not save %s to %s' % (description, filename))
+
+
+# maximum size of the arrays kept by each cache of grids and PSDs
+cache_maxbytes = 2**28
+
+# frequency grids used to simulate stochastic signals
+_frequency_grids = LRUCache(maxsize=16, maxbytes=cache_maxbytes)
+
+def as_days(t):
+    """ Times `t` as a plain array, in days """
+    try:
+        return t.to_value(units.day)
+    except AttributeError:
+        return np.asarray(t, dtype=float)
+
+
+def frequency_grid(t):
+    """ 
+    The frequency grid (in Hz, without units) used to simulate stochastic 
+    signals at times `t` (in days), from 1/timespan up to the Nyquist 
+    frequency of the minimum time spacing. Grids are cached, so this returns 
+    the same (read-only) array for repeated calls with the same times, 
+    together with a hashable key identifying the grid.
+    """
+    t = as_days(t)
+    key = array_key(t)
+    try:
+        return key, _frequency_grids[key]
+    except KeyError:
+        pass
+
+    minf = 1 / np.ptp(t) # periods up to the timespan
+    maxf = 1 / (2*np.ediff1d(t).min()) # down to the min time spacing
+    # freq comes in 1/d from autofrequency
+    freq = LombScargle(t, np.zeros_like(t)).autofrequency(
+                minimum_frequency=minf, maximum_frequency=maxf)
+    nu = freq / units.day.to(units.s)
+    nu.flags.writeable = False
+
+    _frequency_grids[key] = nu
+    return key, nu
+
+
 def power_spectrum(t, y, freq=None):
     assert t.unit == units.day
-    assert y.unit == ms
+    assert y.unit == units.ms
 
     f, p = LombScargle(t, y, normalization='psd').autopower()
     N = t.size
@@ -32,22 +171,156 @@ def convolve_hanning(f, p, window):
     smoothed = np.convolve(kernel, p, mode='SAME')
     return smoothed
 
-def timeseries_from_power_spectrum(freq, power):
+def timeseries_from_power_spectrum(freq, power, size=None, rng=None):
+    """ 
+    Random time series with a given power spectrum. If `size` is given, 
+    return `size` realizations as the rows of a 2-D array, drawing all 
+    Fourier coefficients at once and using a single (batched) inverse FFT.
+    Random numbers come from the numpy.random.Generator `rng`, or from 
+    numpy's global state if it is None.
+    """
+    if rng is None:
+        rng = np.random
     bw = freq[1] - freq[0]
     p = power * bw
-    real_comp = np.random.normal(0, 1, len(p)) * np.sqrt(p / 2.0)
-    imag_comp = np.random.normal(0, 1, len(p)) * np.sqrt(p / 2.0)
+    shape = len(p) if size is None else (size, len(p))
+    real_comp = rng.normal(0, 1, shape) * np.sqrt(p / 2.0)
+    imag_comp = rng.normal(0, 1, shape) * np.sqrt(p / 2.0)
 
     inv_fft = real_comp + 1j*imag_comp
-    y = np.fft.irfft(inv_fft, 2*len(p)) * len(p)
+    y = np.fft.irfft(inv_fft, 2*len(p), axis=-1) * len(p)
     return y
 
 
 def normalise_timeseries(freq, power, time, y):
-    lhs = (1.0 / len(time)) * np.sum(y ** 2)
+    """ Normalise (each row of) `y` to the total power in `power` """
+    lhs = (1.0 / len(time)) * np.sum(y ** 2, axis=-1, keepdims=True)
     bw = freq[1]-freq[0]
     rhs = np.sum(power * bw)
     ratio = lhs / rhs
     # divide by square root to put ratio into amplitude
     y = y / np.sqrt(ratio)
     return y
+
+
+def timeseries_from_psd(nu, power, t, size=None, rng=None):
+    """
+    Simulate `size` (or one) time series at times `t` from the power 
+    spectrum `power` (in m²/s²/Hz) at frequencies `nu` (in Hz). The result
+    is in m/s. All arguments are plain arrays, without units. Realizations
+    are simulated in blocks, to bound the memory.
+    """
+    if size is None:
+        y = timeseries_from_power_spectrum(nu, power, None, rng)[:len(t)]
+        return normalise_timeseries(nu, power, t, y)
+
+    y = np.empty((size, len(t)))
+    block = max(1, 2**22 // (2 * len(nu)))
+    for start in range(0, size, block):
+        n = min(block, size - start)
+        series = timeseries_from_power_spectrum(nu, power, n, rng)
+        y[start:start + n] = series[:, :len(t)]
+    return normalise_timeseries(nu, power, t, y)
+
+
+def interpolation_grid(t, fmax, resolution=None, max_size=2**16):
+    """
+    A uniform frequency grid (in Hz, without units) from 0 to `fmax` (in Hz)
+    for simulating signals at times `t` (in days) by interpolation: the 
+    spacing is 1/(2 timespan), so the simulated series covers twice the 
+    timespan and does not wrap around. The grid is cut at the Nyquist 
+    frequency of the time `resolution` (in days) and at `max_size` points.
+    """
+    t = as_days(t)
+    day = units.day.to(units.s)
+    df = 1 / (2 * np.ptp(t) * day)
+    if resolution is not None:
+        fmax = min(fmax, 1 / (2 * resolution * day))
+    size = int(min(np.ceil(fmax / df), max_size))
+    return df * np.arange(size + 1)
+
+
+def timeseries_from_psd_interpolated(nu, power, t, size=None, rng=None,
+                                     missing_variance=0., 
+                                     samples_per_period=16):
+    """
+    Simulate `size` (or one) time series at times `t` (in days) from the 
+    power spectrum `power` (in m²/s²/Hz) on the uniform grid `nu` (in Hz, 
+    starting at 0, see `interpolation_grid`). The series is simulated on a 
+    regular time grid with one inverse FFT, with at least 
+    `samples_per_period` steps per period of the highest frequency in `nu`,
+    and linearly interpolated at `t`. Linear interpolation damps the 
+    variance at frequency f by (2 + cos(2 pi f dt)) / 3 on average, which 
+    is compensated in the PSD. The first frequency bin only gets half its 
+    width. The power not represented in the grid, `missing_variance`, is 
+    added as white noise. The result is in m/s.
+    """
+    if rng is None:
+        rng = np.random
+    t = as_days(t)
+    df = nu[1] - nu[0]
+    n = next_fast_len(samples_per_period * (nu.size - 1), real=True)
+    dt = 1 / (n * df * units.day.to(units.s))  # in days
+
+    n_series = 1 if size is None else size
+    damping = (2 + np.cos(2 * np.pi * nu * dt * units.day.to(units.s))) / 3
+    amplitude = np.sqrt(power / damping * df / 4)
+    # the constant term holds the power below df/2, correlated over the 
+    # whole timespan
+    amplitude[0] = np.sqrt(power[0] * df / 2)
+    x = (t - t.min()) / dt
+    i = np.minimum(x.astype(int), n - 2)
+    w = x - i
+
+    # realizations are simulated in blocks, to bound the memory
+    y = np.empty((n_series, t.size))
+    block = max(1, 2**22 // n)
+    for start in range(0, n_series, block):
+        shape = (min(block, n_series - start), nu.size)
+        coefficients = rng.normal(0, 1, shape) + 1j * rng.normal(0, 1, shape)
+        series = np.fft.irfft(coefficients * amplitude, n, axis=-1) * n
+        y[start:start + shape[0]] = series[:, i] * (1 - w) + \
+                                    series[:, i + 1] * w
+    if missing_variance > 0:
+        y += rng.normal(0, np.sqrt(missing_variance), y.shape)
+    return y[0] if size is None else y
+
+
+def autocovariance_from_psd(psd, tau, fmax, oversample=4, max_size=2**22):
+    """
+    The autocovariance (in m²/s²) at time lags `tau` (in days) of a process
+    with power spectrum `psd` (a function of the frequency in Hz, giving 
+    m²/s²/Hz), as the cosine transform of the PSD up to `fmax` (in Hz), 
+    computed with one inverse FFT on a regular grid of lags and 
+    interpolated at `tau` (with cubic Lagrange polynomials). The lags are 
+    `oversample` times finer than the Nyquist sampling of fmax and only go 
+    up to max|tau|, with at least 2**14 frequencies to resolve the features
+    of the PSD. The FFT has at most `max_size` points; lags beyond the ones
+    it reaches get zero covariance (with a warning if it has not decayed).
+    """
+    day = units.day.to(units.s)
+    tau = np.abs(np.asarray(tau, dtype=float))
+    dt = 1 / (2 * fmax * oversample * day)  # in days
+    n = 2 * max(int(np.ceil(tau.max() / dt)) + 1, 2**14 * oversample)
+    n = min(next_fast_len(n, real=True), max_size)
+    df = 1 / (n * dt * day)
+
+    X = np.zeros(n // 2 + 1)
+    size = min(int(np.ceil(fmax / df)), n // 2)
+    X[:size + 1] = psd(df * np.arange(size + 1)) * df
+    X[0] /= 2
+    k = (np.fft.irfft(X, n)[:n // 2 + 1] * n + X[0]) / 2
+    if tau.max() > dt * (n // 2) and np.abs(k[-n // 8:]).max() > 1e-6 * k[0]:
+        warnings.warn('autocovariance set to zero for lags above %g days, '
+                      'where it has not decayed; increase `max_size`' % 
+                      (dt * (n // 2)))
+
+    # k is even, and zero beyond the last lag
+    k = np.concatenate([k[1:2], k, np.zeros(3)])
+    x = np.minimum(tau / dt, n // 2 + 1)
+    i = x.astype(int)
+    u = x - i
+    return - u * (u - 1) * (u - 2) / 6 * k[i] \
+        + (u + 1) * (u - 1) * (u - 2) / 2 * k[i + 1] \
+        - (u + 1) * u * (u - 2) / 2 * k[i + 2] \
+        + (u + 1) * u * (u - 1) / 6 * k[i + 3]
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 from setuptools import setup, Extension
-# from Cython.Build import cythonize
-# from numpy import get_include
 
-extensions = [
-    Extension("sam._kepler", ["kepler/_kepler.pyx"],)
-]
+# The C/Cython Kepler solver is built by default. If Cython or numpy are not
+# available at build time (or compilation fails), SAM falls back to the 
+# pure-numpy solver in sam/kepler.py
+try:
+    from Cython.Build import cythonize
+    from numpy import get_include
+    extensions = [
+        Extension("sam._kepler", ["kepler/_kepler.pyx"],
+                  include_dirs=["kepler", get_include()],
+                  extra_compile_args=["-O2", "-w"],
+                  optional=True)
+    ]
+    ext_modules = cythonize(extensions, language_level=3)
+except ImportError:
+    ext_modules = []
 
 
 ## SAM version
@@ -31,9 +41,8 @@ setup(name='sam',
       author_email='joao.faria@astro.up.pt',
       license='MIT',
       packages=['sam'],
+      package_data={'sam': ['data/*']},
       install_requires=['astropy',],
-      # ext_modules = cythonize(extensions),
-      # extra_compile_args = ["-O2 -w"], 
-      # include_dirs = [get_include()],
+      ext_modules=ext_modules,
       include_package_data=True,
       zip_safe=False)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from sam import ScheduleCatalog, TimeSampling
+
+
+def test_build_and_select(tmp_path):
+	schedules = [np.arange(5.), np.arange(10., 13.), np.arange(20., 40.)]
+	catalog = ScheduleCatalog.build(str(tmp_path), schedules,
+	                                targets=['HD1', 'HD2', 'GJ3'],
+	                                instruments=['HARPS', 'ESPRESSO', 'HARPS'])
+	catalog = ScheduleCatalog(str(tmp_path))
+	assert len(catalog) == 3
+	np.testing.assert_array_equal(catalog.nobs, [5, 3, 20])
+	np.testing.assert_array_equal(catalog.get_times('HD2'), schedules[1])
+	assert isinstance(catalog.times, np.memmap)
+	assert isinstance(catalog[-1], TimeSampling)
+	np.testing.assert_array_equal(catalog[-1].get_times(), schedules[2])
+
+	np.testing.assert_array_equal(catalog.select(instrument='HARPS'), [0, 2])
+	np.testing.assert_array_equal(catalog.select(target='HD*', min_nobs=4), [0])
+	with pytest.raises(KeyError):
+		catalog['nope']
+
+
+def test_lce(tmp_path):
+	catalog = ScheduleCatalog.lce(str(tmp_path / 'lce'))
+	assert len(catalog) == 1680
+	assert catalog['LCE0001'].nobs == 6
+	# opened from disk the second time
+	assert len(ScheduleCatalog.lce(str(tmp_path / 'lce'))) == 1680
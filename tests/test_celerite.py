@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from scipy.integrate import quad
+
+from sam import Granulation, Oscillation, units
+from sam import _celerite
+
+
+terms = np.array([[1.3, 0., 0.7, 0.],
+                  [0.5, 0.5, 2.0, 2.0],
+                  [0.2, 0., 0.3, 9.0]])
+
+
+def dense(t, terms):
+	return _celerite.kernel(t[:, np.newaxis] - t, terms)
+
+
+def test_factor():
+	t = np.sort(np.random.default_rng(1).uniform(0, 20, 60))
+	U, P, D, W = _celerite.factor(t, terms, diag=0.1)
+	# rebuild L = I + tril(U W^T), with the P factors
+	n = t.size
+	L = np.eye(n)
+	for i in range(n):
+		for j in range(i):
+			decay = np.prod(P[j:i], axis=0)
+			L[i, j] = U[i] @ (decay * W[j])
+	K = dense(t, terms) + 0.1 * np.eye(n)
+	np.testing.assert_allclose(L @ np.diag(D) @ L.T, K, atol=1e-10)
+
+
+def test_python_fallback(monkeypatch):
+	t = np.r_[0., 0., np.sort(np.random.default_rng(1).uniform(0, 20, 60))]
+	c_factor = _celerite._factor(t, terms)
+	y = _celerite.sample(t, terms, size=3, rng=np.random.default_rng(5))
+	monkeypatch.setattr(_celerite, 'cext', False)
+	_celerite._factors.clear()
+	for a, b in zip(_celerite._factor(t, terms), c_factor):
+		np.testing.assert_allclose(a, b, atol=1e-12)
+	np.testing.assert_allclose(
+		_celerite.sample(t, terms, size=3, rng=np.random.default_rng(5)), y,
+		atol=1e-12)
+
+
+def test_sample_covariance():
+	t = np.random.default_rng(2).uniform(0, 5, 8)  # unsorted
+	y = _celerite.sample(t, terms, size=200000, rng=np.random.default_rng(3))
+	assert y.shape == (200000, t.size)
+	np.testing.assert_allclose(np.cov(y.T), dense(t, terms), atol=0.03)
+
+
+@pytest.mark.parametrize('model', ['harvey', 'kallinger'])
+def test_granulation_terms(model):
+	g = Granulation(sigma=0.1, tau=3, model=model, method='celerite')
+	terms = g.celerite_terms()
+	# the variance is the integral of the PSD
+	variance = quad(lambda x: g._psd(x / g._B), 0, np.inf)[0] / g._B
+	assert _celerite.kernel(0., terms) == pytest.approx(variance, rel=1e-3)
+	# and the PSD is the Fourier transform of the kernel
+	nu0 = 1 / g._B
+	psd = 4 * quad(lambda tau: _celerite.kernel(tau / 86400, terms),
+	               0, np.inf, weight='cos', wvar=2*np.pi*nu0)[0]
+	assert psd == pytest.approx(g._psd(nu0), rel=1e-3)
+
+	t = np.sort(np.random.default_rng(4).uniform(0, 10, 50))
+	y = g.sample_many(5, t)
+	assert y.shape == (5, t.size)
+
+
+def test_oscillation_terms():
+	o = Oscillation(sigma=0.5, width=200, numax=3000, method='celerite')
+	terms = o.celerite_terms()
+	nu = o._nu0
+	psd = 4 * quad(lambda tau: _celerite.kernel(tau / 86400, terms),
+	               0, np.inf, weight='cos', wvar=2*np.pi*nu)[0]
+	assert psd == pytest.approx(o._psd(nu), rel=1e-2)
+	with pytest.raises(ValueError):
+		Oscillation(model='gaussian', method='celerite').sample(np.arange(3.))
+
+
+def test_interpolate_method():
+	rng = np.random.default_rng(5)
+	# near-simultaneous exposures don't blow up the grid
+	t = np.sort(np.r_[rng.uniform(0, 1000, 100), 500 + 1e-5 * np.arange(3)])
+	g = Granulation(sigma=0.1, tau=3, model='kallinger', method='interpolate',
+	                seed=6)
+	# (and the power beyond them is reported)
+	with pytest.warns(UserWarning, match='holds'):
+		assert g.grid_size(t) <= g.max_grid_size + 1
+	g.max_grid_size = 1000
+	with pytest.warns(UserWarning, match='holds'):
+		assert g.grid_size(t) == 1001
+	y = g.sample_many(3000, t)
+	# the variance is preserved, whatever the grid size
+	variance = _celerite.kernel(0., g.celerite_terms())
+	assert y.var() == pytest.approx(variance, rel=0.05)
+
+	# and the correlations follow the celerite kernel
+	t = np.array([0., 0.05, 0.1, 0.2, 0.5, 2.])
+	g.max_grid_size = 2**16
+	y = g.sample_many(20000, t)
+	np.testing.assert_allclose(np.corrcoef(y.T)[0],
+	                           _celerite.kernel(t, g.celerite_terms()) / variance,
+	                           atol=0.03)
+
+	# oscillations are sampled finely enough not to lose variance
+	t = np.sort(rng.uniform(0, 2, 60))
+	o = Oscillation(width=5, method='interpolate', seed=7)
+	assert o.sample_many(4000, t).var() == pytest.approx(o.covariance(0.),
+	                                                     rel=0.05)
+	t = np.r_[np.arange(6) / 1440, 2.]
+	y = o.sample_many(10000, t)
+	np.testing.assert_allclose(np.cov(y.T)[0, :6], o.covariance(t[:6]),
+	                           atol=0.05 * o.covariance(0.))
+	# but on long timespans the grid stops below numax
+	with pytest.warns(UserWarning, match='holds 0.0%'):
+		o.grid_size(np.linspace(0, 300, 50))
+
+
+
+@pytest.mark.parametrize('component', [
+	lambda method: Granulation(sigma=0.1, tau=3, model='harvey', method=method),
+	lambda method: Granulation(sigma=0.1, tau=3, model='kallinger', method=method),
+	lambda method: Oscillation(method=method)])
+@pytest.mark.parametrize('method', ['celerite', 'cholesky'])
+def test_repeated_times(component, method):
+	t = np.array([0., 0.3, 0.3, 1.2, 2., 2., 2., 3.5]) / 300
+	c = component(method)
+	y = c.sample_many(5000, t)
+	assert np.isfinite(y).all()
+	# equal values at equal times
+	np.testing.assert_allclose(y[:, 1], y[:, 2], rtol=1e-8)
+	np.testing.assert_allclose(y[:, 4], y[:, 6], rtol=1e-8)
+	np.testing.assert_allclose(np.cov(y.T), c.covariance_matrix(t),
+	                           atol=0.1 * c.covariance(0.))
@@ -0,0 +1,183 @@
+import os
+import numpy as np
+import pytest
+
+from sam import Planet, Offset, Slope, WhiteNoise
+from sam.components import Model
+
+t = np.linspace(0, 100, 50)
+
+
+def test_flat_model():
+	p1, p2 = Planet(P=10., K=1., e=0.), Planet(P=3., K=2., e=0.1)
+	o, w = Offset(2.), WhiteNoise(0.5, seed=1)
+	m = p1 + p2 + o + w
+	assert isinstance(m, Model)
+	assert m.components == [p1, p2, o, w]
+	assert (p1 + (p2 + o)).components == [p1, p2, o]
+	assert sum([p1, p2, o]).components == [p1, p2, o]
+
+	y = m.sample(t)
+	assert y.shape == t.shape
+	np.testing.assert_allclose(y, sum(c.sample(t) for c in m.components))
+	for c, yc in zip(m.components, m.contributions):
+		np.testing.assert_array_equal(yc, c.sample(t))
+
+
+def test_model_with_grid():
+	m = Planet(P=[5., 10., 20.], K=1., e=0.) + Slope(0.1)
+	assert m.sample(t).shape == (t.size, 3)
+
+
+def test_memoize():
+	p, w = Planet(P=10., K=1., e=0.3), WhiteNoise(1., seed=3)
+	m = p + w
+	m.memoize(maxsize=2)
+	y = p.sample(t)
+	assert p.sample(t.copy()) is y
+	assert not y.flags.writeable
+	assert w.sample(t) is w.sample(t)
+	# random state changes are never cached
+	assert w.sample(t, True) is not w.sample(t, True)
+	# changing parameters invalidates
+	w.sd = 2.
+	np.testing.assert_allclose(w.sample(t).std(), 2., rtol=0.2)
+	p.memoize(0)
+	assert p.sample(t) is not p.sample(t)
+
+
+def test_save_realizations(tmp_path):
+	m = Offset(1.) + WhiteNoise(0.5, seed=2)
+	path = str(tmp_path / 'sims')
+	store = m.save_realizations(path, 25, t, chunk_size=10)
+	assert len(store) == 25
+	assert store.columns == ['component0', 'component1', 'rv']
+	rv = store.read()
+	assert rv.shape == (25, t.size)
+	np.testing.assert_allclose(rv, store.read('component0')
+	                               + store.read('component1'))
+	# appending gives new realizations
+	m.save_realizations(path, 5, t)
+	from sam import SimulationStore
+	store = SimulationStore(path, mode='r')
+	assert len(store) == 30
+	assert not np.allclose(store.read()[:5], store.read()[-5:])
+
+
+def test_save_rdb(tmp_path):
+	m = Offset(1.) + WhiteNoise(0.5, seed=2)
+	filename = str(tmp_path / 'sim.rdb')
+	m.save_rdb(filename, t)
+	with pytest.raises(FileExistsError):
+		m.save_rdb(filename, t)
+	m.save_rdb(filename, t, units='kms', overwrite=True)
+	data = np.loadtxt(filename, skiprows=2)
+	assert data.shape == (t.size, 3)
+
+
+def test_covariance_functions():
+	from sam import Granulation, Oscillation
+	from sam.utils import autocovariance_from_psd
+	tau = np.linspace(-2, 2, 101)
+	# numerical covariance of a generic PSD, against the analytic one
+	harvey = Granulation(sigma=0.1, tau=3, model='harvey')
+	generic = Granulation(sigma=0.1, tau=3, C=2)
+	np.testing.assert_allclose(generic.covariance(tau), harvey.covariance(tau),
+	                           rtol=0, atol=2e-3 * harvey.covariance(0.))
+	# lags of years, with a capped FFT size
+	far = generic.covariance(np.r_[0., 1., 3000.])
+	np.testing.assert_allclose(far, harvey.covariance(np.r_[0., 1., 3000.]),
+	                           rtol=0, atol=2e-3 * harvey.covariance(0.))
+	with pytest.warns(UserWarning):
+		# a lag of 3000 d beyond the FFT, for a correlation time of ~1000 d
+		autocovariance_from_psd(lambda nu: 1 / (1 + (1e8 * nu)**2),
+		                        [0., 3000.], 1e-6, max_size=2**10)
+	gaussian = Oscillation(sigma=0.5, width=200, numax=3000, model='gaussian')
+	numeric = autocovariance_from_psd(gaussian._psd, tau / 1000, 5e-3)
+	np.testing.assert_allclose(gaussian.covariance(tau / 1000), numeric,
+	                           atol=5e-3 * numeric[50])
+	assert WhiteNoise(2.).covariance(0.) == 4.
+	assert Offset(1.).covariance(0.) == 0.
+
+
+def test_cholesky_cache(tmp_path, monkeypatch):
+	from sam import Granulation, components
+	monkeypatch.setenv('SAM_CACHE_DIR', str(tmp_path))
+	t = np.r_[0., 0., np.sort(np.random.default_rng(1).uniform(0, 10, 30))]
+	m = WhiteNoise(0.5, seed=1) + Granulation(sigma=0.1, tau=3, model='harvey')
+	C = m.covariance_matrix(t)
+	np.testing.assert_allclose(C, 0.25 * np.eye(t.size) + 
+	                              m.components[1].covariance(t[:, None] - t))
+	L = m.cholesky(t, disk_cache=True)
+	np.testing.assert_allclose(L @ L.T, C, atol=1e-12)
+	# which is not kept once L exists
+	from sam.utils import array_key
+	assert (array_key(t), m._covariance_key()) not in components._covariances
+	assert components._choleskys.maxbytes == components.cache_maxbytes
+	# same factor for other seeds, from memory
+	m2 = WhiteNoise(0.5, seed=2) + Granulation(sigma=0.1, tau=3, model='harvey')
+	assert m2.cholesky(t) is L
+	# and from disk, in a new session
+	components._choleskys.clear()
+	L2 = m2.cholesky(t, disk_cache=True)
+	assert isinstance(L2, np.memmap)
+	np.testing.assert_array_equal(L2, L)
+	m2.components[0].sd = 1.
+	assert not np.allclose(m2.cholesky(t), L)
+	assert all(f.endswith('.npy') for f in os.listdir(tmp_path / 'covariance'))
+	# an unusable cache directory only gives a warning
+	(tmp_path / 'file').write_text('')
+	monkeypatch.setenv('SAM_CACHE_DIR', str(tmp_path / 'file'))
+	components._choleskys.clear()
+	with pytest.warns(UserWarning):
+		np.testing.assert_array_equal(m.cholesky(t, disk_cache=True), L)
+
+
+def test_cholesky_sampling():
+	from sam import Granulation, Oscillation
+	t = np.sort(np.random.default_rng(3).uniform(0, 2, 12))
+	g = Granulation(sigma=0.1, tau=3, model='kallinger', method='cholesky',
+	                seed=4)
+	y = g.sample_many(20000, t)
+	assert y.shape == (20000, t.size)
+	C = g.covariance_matrix(t)
+	np.testing.assert_allclose(np.cov(y.T), C, atol=0.03 * C[0, 0])
+	assert g.sample(t).shape == t.shape
+	np.testing.assert_array_equal(g.sample(t), g.sample(t))
+	# any model, e.g. Gaussian oscillations
+	o = Oscillation(model='gaussian', method='cholesky')
+	assert o.sample_many(3, t).shape == (3, t.size)
+
+
+@pytest.mark.parametrize('width', [0.5, 200])
+def test_cholesky_dense_sampling(width):
+	from sam import Oscillation
+	# smooth kernels sampled every minute are singular up to round-off
+	t = np.arange(0, .3, 1/1440)
+	o = Oscillation(model='gaussian', width=width, method='cholesky', seed=1)
+	y = o.sample_many(3, t)
+	assert y.shape == (3, t.size) and np.isfinite(y).all()
+	L = o.cholesky(t)
+	C = o.covariance_matrix(t)
+	np.testing.assert_allclose(L @ L.T, C, atol=1e-5 * C[0, 0])
+
+
+def test_model_cholesky_sampling():
+	from sam import Granulation
+	t = np.sort(np.random.default_rng(3).uniform(0, 2, 12))
+	m = Offset(2.) + WhiteNoise(0.5, seed=1) + \
+	    Granulation(sigma=0.1, tau=3, model='harvey', seed=2)
+	y = m.sample_many(20000, t, method='cholesky')
+	assert y.shape == (20000, t.size)
+	np.testing.assert_allclose(y.mean(axis=0), 2., atol=0.1)
+	C = m.covariance_matrix(t)
+	np.testing.assert_allclose(np.cov(y.T), C, atol=0.03 * C[0, 0])
+	with pytest.raises(ValueError):
+		m.sample_many(2, t, method='nope')
+	# non-Gaussian noise keeps its own distribution
+	from scipy import stats
+	from sam import DistributedNoise
+	m = Offset(0.) + DistributedNoise(stats.uniform(0, 1), seed=1)
+	y = m.sample_many(20000, t, method='cholesky')
+	assert y.min() >= 0. and y.max() <= 1.
+	np.testing.assert_allclose(y.mean(), 0.5, atol=0.01)
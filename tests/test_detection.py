@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from sam import GLSPeriodogram
+from sam.utils import LombScargle
+
+rng = np.random.default_rng(0)
+t = np.sort(rng.uniform(0, 300, 80))
+err = rng.uniform(0.5, 2, t.size)
+
+
+def test_matches_astropy():
+	y = 2 * np.sin(2 * np.pi * t / 17.) + rng.normal(0, 1, (5, t.size)) + 3
+	gls = GLSPeriodogram(t, err=err, block_size=100)
+	power = gls.power(y)
+	assert power.shape == (5, gls.freq.size)
+	for i in range(5):
+		expected = LombScargle(t, y[i], err).power(gls.freq)
+		np.testing.assert_allclose(power[i], expected, atol=1e-10)
+
+	peaks = gls.peaks(y)
+	np.testing.assert_allclose(1 / peaks['frequency'], 17., rtol=0.02)
+	assert np.all(peaks['fap'] < 1e-3)
+	assert gls.false_alarm_probability(0.05) > 0.5
+
+
+def test_bounded_memory():
+	y = rng.normal(0, 1, (3, t.size))
+	gls = GLSPeriodogram(t, err=err, block_size=100)
+	# keep the (co)sine terms of only one block
+	lazy = GLSPeriodogram(t, err=err, block_size=100,
+	                      max_bytes=2 * 8 * t.size * 100)
+	assert len(lazy._trig) == 1 < len(lazy._blocks)
+	np.testing.assert_allclose(lazy.power(y), gls.power(y), atol=1e-12)
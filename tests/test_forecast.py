@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from sam import FisherForecast, Planet, WhiteNoise, Granulation, kepler
+
+
+t = np.sort(np.random.default_rng(1).uniform(0, 200, 80))
+
+
+def test_white_noise():
+	forecast = FisherForecast(WhiteNoise(2.), t)
+	p = Planet(P=10.3, K=3., e=0.1, omega=0.5, Tp=0.)
+	f = forecast.forecast(p)
+	rv = p.getrv(t)
+	assert f['snr'] == pytest.approx(np.sqrt((rv**2).sum()) / 2.)
+	# sigma_K ~ sigma * sqrt(2/N)
+	assert f['sigma'][1] == pytest.approx(2. * np.sqrt(2 / t.size), rel=0.2)
+	# a single epoch
+	f = FisherForecast(WhiteNoise(2.), [1.]).forecast(p, ('K', ))
+	assert f['snr'] == pytest.approx(abs(p.getrv(np.array([1.]))[0]) / 2.)
+
+
+def test_grid_matches_dense():
+	noise = WhiteNoise(1.) + Granulation(sigma=0.1, tau=3, model='harvey')
+	forecast = FisherForecast(noise, t)
+	p = Planet(P=np.linspace(5, 50, 4), K=[1., 5.], e=[0.1, 0.5], 
+	           omega=0.3, Tp=0.)
+	f = forecast.forecast(p, block_size=3)
+	assert f['snr'].shape == (4, 2, 2)
+	assert f['sigma'].shape == (4, 2, 2, 5)
+
+	Cinv = np.linalg.inv(forecast.covariance)
+	orbits = kepler.OrbitBatch(*p.orbit_block())
+	rv, jac = kepler.rv_curve_jacobian(t, orbits)
+	for g in range(p.gridsize):
+		i = np.unravel_index(g, f['snr'].shape)
+		assert f['snr'][i] == pytest.approx(np.sqrt(rv[:, g] @ Cinv @ rv[:, g]))
+		F = jac[:, g].T @ Cinv @ jac[:, g]
+		np.testing.assert_allclose(f['sigma'][i], np.sqrt(np.diag(np.linalg.inv(F))),
+		                           rtol=1e-6)
+
+	# the detection limit scales with the SNR
+	Kmin = forecast.detection_limit(p, snr=10.)
+	np.testing.assert_allclose(Kmin[:, 0], Kmin[:, 1])
+
+
+def test_deterministic_components():
+	from sam import Offset
+	f1 = FisherForecast(Offset(1.) + WhiteNoise(1.), t)
+	f2 = FisherForecast(WhiteNoise(1.), t)
+	np.testing.assert_allclose(f1.L, f2.L)
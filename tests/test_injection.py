@@ -0,0 +1,28 @@
+import os
+import numpy as np
+import pytest
+
+from sam import InjectionRecovery, WhiteNoise
+
+t = np.sort(np.random.default_rng(1).uniform(0, 200, 60))
+
+
+def test_run_and_resume(tmp_path):
+	ir = InjectionRecovery(WhiteNoise(1.), t, P=[5., 40.], K=[0.1, 5.],
+	                       n_realizations=3, seed=7, chunk_size=5)
+	assert ir.n_tasks == 3
+	results = ir.run(str(tmp_path), max_workers=2)
+	assert results['detected'].size == ir.size
+	prob = ir.detection_probability(results)
+	assert prob.shape == (2, 2, 1)
+	assert np.all(prob[:, 1] == 1.) and np.all(prob[:, 0] == 0.)
+
+	# resuming recomputes exactly the missing task
+	os.remove(os.path.join(str(tmp_path), 'task-000001.npz'))
+	again = ir.run(str(tmp_path), max_workers=1)
+	for key in results:
+		np.testing.assert_array_equal(results[key], again[key])
+
+	other = InjectionRecovery(WhiteNoise(1.), t, P=[5.], K=[1.], seed=8)
+	with pytest.raises(ValueError):
+		other.run(str(tmp_path))
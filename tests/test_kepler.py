@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from sam import kepler
+
+
+def test_kepler_equation():
+	M = np.linspace(0, 2*np.pi, 50)
+	e = np.linspace(0, 0.99, 7)
+	MM, ee = np.meshgrid(M, e)
+	E = kepler.kepler(MM, ee)
+	assert E.shape == MM.shape
+	np.testing.assert_allclose(E - ee*np.sin(E), MM, atol=1e-11)
+	# scalar input
+	E = kepler.kepler(1.0, 0.5)
+	assert np.ndim(E) == 0
+	np.testing.assert_allclose(E - 0.5*np.sin(E), 1.0, atol=1e-11)
+	# size-1 arrays stay arrays
+	assert kepler.kepler(np.array([1.0]), 0.5).shape == (1, )
+	for backend in kepler.backends if kepler.cext else ['numpy']:
+		rv = kepler.rv_curve_grid([1.], [10.], [1.], [.3], [.1], [0.],
+		                          backend=backend)
+		assert rv.shape == (1, 1)
+
+
+def test_grid_matches_single():
+	t = np.linspace(0, 100, 40)
+	pars = [np.array([P, K, e, 0.3, 57000.])
+	        for P in (3., 17.) for K in (1., 5.) for e in (0., 0.4, 0.9)]
+	rv = kepler.rv_curve(t, pars)
+	assert rv.shape == (t.size, len(pars))
+	for i, p in enumerate(pars):
+		np.testing.assert_allclose(rv[:, i], kepler.rv_curve(t, tuple(p)),
+		                           atol=1e-10)
+
+
+def test_eccentricity_dispatch():
+	t = np.linspace(0, 100, 40)
+	e = np.array([0., 0.03, 0.1, 0.11, 0.5, 0.])
+	per, k, om, tp = np.full(e.size, 7.), np.ones(e.size), \
+	                 np.full(e.size, 0.3), np.zeros(e.size)
+	rv = kepler.rv_curve_grid(t, per, k, e, om, tp, backend='numpy')
+	for i in range(e.size):
+		np.testing.assert_allclose(
+			rv[:, i], kepler.rv_curve(t, (7., 1., e[i], 0.3, 0.), backend='numpy'),
+			atol=1e-10)
+
+
+@pytest.mark.skipif(not kepler.cext, reason='C extension not built')
+def test_backends_agree():
+	t = np.linspace(0, 100, 40)
+	pars = [np.array([P, 2., e, 0.3, 57000.])
+	        for P in (3., 17.) for e in (0.1, 0.6, 0.95)]
+	np.testing.assert_allclose(kepler.rv_curve(t, pars, backend='c'),
+	                           kepler.rv_curve(t, pars, backend='numpy'),
+	                           atol=1e-10)
+	np.testing.assert_allclose(kepler.rv_curve(t, tuple(pars[3]), backend='c'),
+	                           kepler.rv_curve(t, tuple(pars[3]), backend='numpy'),
+	                           atol=1e-10)
+
+
+def test_unknown_backend():
+	with pytest.raises(ValueError):
+		kepler.rv_curve(np.arange(3.), (3., 1., 0.1, 0., 0.), backend='fortran')
+
+
+def test_table_solver(tmp_path, monkeypatch):
+	monkeypatch.setenv('SAM_CACHE_DIR', str(tmp_path))
+	table = kepler.EccentricAnomalyTable(nM=256, ne=32)
+	assert len(list(tmp_path.iterdir())) == 1
+	# loaded from the cache the second time
+	table = kepler.EccentricAnomalyTable(nM=256, ne=32)
+	assert isinstance(table.table, np.memmap)
+
+	M = np.linspace(-3, 15, 200)
+	e = np.linspace(0, 0.99, 200)
+	E = table(M, e)
+	np.testing.assert_allclose(E - e*np.sin(E), M, atol=1e-12)
+
+
+def test_orbit_batch_workspace():
+	t = np.linspace(0, 100, 40)
+	per = np.array([3., 17., -1.])
+	e = np.array([0., 0.5, 1.2])
+	batch = kepler.OrbitBatch(per, 2., e, 0.3, 57000.)
+	# validated on a copy
+	assert per[2] == -1. and batch.per[2] == 1e-4 and batch.e[2] == 0.99
+
+	ws = kepler.Workspace(t, len(batch))
+	rv = kepler.rv_curve(t, batch, workspace=ws)
+	assert rv is ws.rv
+	np.testing.assert_allclose(rv, kepler.rv_curve(t, batch, backend='numpy'),
+	                           atol=1e-8)
+	with pytest.raises(ValueError):
+		kepler.rv_curve(t, kepler.OrbitBatch(3., 1., 0.1, 0., 0.), workspace=ws)
+	with pytest.raises(ValueError):
+		kepler.rv_curve(t + 1.3, batch, workspace=ws)
+
+
+def test_jacobian():
+	t = np.linspace(57000, 57100, 40)
+	pars = np.array([[7.3, 2., 0.3, 0.4, 57001.],
+	                 [31., 5., 0.05, 2.1, 57010.],
+	                 [3.1, 1., 0.8, -1., 57002.]])
+	rv, jac = kepler.rv_curve_jacobian(t, kepler.OrbitBatch(*pars.T))
+	assert rv.shape == (t.size, 3) and jac.shape == (t.size, 3, 5)
+	np.testing.assert_allclose(rv, kepler.rv_curve(t, list(pars), backend='numpy'),
+	                           atol=1e-10)
+	for i, p in enumerate(pars):
+		rv1, jac1 = kepler.rv_curve_jacobian(t, tuple(p))
+		np.testing.assert_allclose(jac1, jac[:, i], atol=1e-9)
+		for j in range(5):
+			h = np.zeros(5)
+			h[j] = 1e-6
+			numeric = (kepler.rv_curve(t, tuple(p + h), backend='numpy') -
+			           kepler.rv_curve(t, tuple(p - h), backend='numpy')) / 2e-6
+			np.testing.assert_allclose(jac1[:, j], numeric, rtol=1e-6, atol=1e-5)
+
+	# a single epoch
+	rv, jac = kepler.rv_curve_jacobian([0.5], [10., 1., .3, .1, 0.])
+	assert rv.shape == (1, ) and jac.shape == (1, 5)
+	np.testing.assert_allclose(rv, kepler.rv_curve([0.5], (10., 1., .3, .1, 0.)))
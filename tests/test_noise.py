@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from sam import Granulation, Oscillation, WhiteNoise, Offset
+
+t = np.arange(0, 50, 0.5)
+
+
+@pytest.mark.parametrize("component", [
+	Granulation(model='harvey'), Oscillation(), WhiteNoise(2.)])
+def test_sample_many(component):
+	y = component.sample_many(10, t)
+	assert y.shape == (10, t.size)
+	# realizations differ from each other
+	assert not np.allclose(y[0], y[1])
+	# reproducible, unless the random state is changed
+	np.testing.assert_array_equal(y, component.sample_many(10, t))
+
+
+def test_sample_many_sum():
+	y = (Offset(3.) + WhiteNoise(1.)).sample_many(4, t)
+	assert y.shape == (4, t.size)
+	assert abs(y.mean() - 3.) < 0.5
+
+
+def test_unitless_psd():
+	from sam import units
+	nu = np.logspace(-6, -2, 20) * units.Hz
+	g = Granulation(model='harvey')
+	np.testing.assert_allclose(g.get_psd(nu).value,
+	                           g.psd_harvey(nu, g.sigma, g.tau).value)
+	g.sigma = 0.02
+	assert g.sigma.unit == g.get_psd(nu).unit
+	np.testing.assert_allclose(g.get_psd(nu).value,
+	                           g.psd_harvey(nu, g.sigma, g.tau).value)
+
+	o = Oscillation(model='gaussian')
+	np.testing.assert_allclose(o.get_psd(nu).value,
+	                           o.psd_gaussian(nu, o.sigma, o.width, o.numax).value)
+
+
+def test_seeded_streams():
+	a, b = WhiteNoise(1., seed=42), WhiteNoise(1., seed=42)
+	np.testing.assert_array_equal(a.sample(t), b.sample(t))
+	# the running stream advances
+	y1 = a.sample(t, change_random_state=True)
+	y2 = a.sample(t, change_random_state=True)
+	assert not np.allclose(y1, y2)
+
+	g = Granulation(model='harvey', seed=1)
+	children = g.spawn(3)
+	assert len(children) == 3
+	y = [c.sample(t) for c in children]
+	assert not np.allclose(y[0], y[1])
+	# spawning again gives new streams, but the same seed gives the same ones
+	assert not np.allclose(y[0], g.spawn(1)[0].sample(t))
+	np.testing.assert_array_equal(
+		y[0], Granulation(model='harvey', seed=1).spawn(3)[0].sample(t))
@@ -19,4 +19,51 @@ def test_repr(kwargs, representation):
 def test_set_grid():
 	assert Planet(P=[1.,2.]).grid == True
 	assert Planet(K=[1.,2.]).grid == True
-	assert Planet(e=[0.1,0.9]).grid == True
\ No newline at end of file
+	assert Planet(e=[0.1,0.9]).grid == True
+
+def test_grid_blocks():
+	import numpy as np
+	p = Planet(P=np.linspace(2, 50, 30), K=[1., 2., 3.], e=0.2)
+	t = np.linspace(0, 100, 57)
+	rv = p.getrv(t)
+	assert rv.shape == (t.size, p.gridsize)
+
+	out = np.empty_like(rv, dtype=np.float32)
+	p.getrv(t, out=out, block_size=7)
+	np.testing.assert_allclose(out, rv, atol=1e-5)
+
+	blocks = []
+	assert p.getrv(t, block_size=40,
+	               callback=lambda sl, b: blocks.append(sl)) is None
+	assert [(sl.start, sl.stop) for sl in blocks] == [(0, 40), (40, 80), (80, 90)]
+
+
+def test_planetary_system():
+	import numpy as np
+	from sam import PlanetarySystem, kepler
+	planets = [Planet(P=P, K=K, e=e, omega=0.3, Tp=57000.)
+	           for P, K, e in [(3., 1., 0.), (17., 2.5, 0.4), (120., 4., 0.9)]]
+	system = PlanetarySystem.from_planets(*planets)
+	assert len(system) == 3
+	t = np.linspace(57000, 58000, 3001)
+	expected = sum(p.sample(t) for p in planets)
+	backends = ['numpy'] + (['c'] if kepler.cext else [])
+	for backend in backends:
+		np.testing.assert_allclose(system.getrv(t, backend=backend), expected,
+		                           atol=1e-9)
+	out = np.empty(t.size)
+	assert system.getrv(t, out=out) is out
+	np.testing.assert_allclose(system.sample(t), expected, atol=1e-9)
+	with pytest.raises(ValueError):
+		PlanetarySystem.from_planets(Planet(P=[1., 2.]))
+
+
+def test_planet_jacobian():
+	import numpy as np
+	t = np.linspace(0, 50, 20)
+	p = Planet(P=[5., 11.], K=[1., 2.], e=0.2, omega=0.1, Tp=0.)
+	rv, jac = p.jacobian(t)
+	assert jac.shape == (t.size, 4, 5)
+	np.testing.assert_allclose(rv, p.getrv(t), atol=1e-10)
+	# dRV/dK is RV/K
+	np.testing.assert_allclose(jac[..., 1] * p.orbit_block()[1], rv, atol=1e-10)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from sam import TimeSampling
+from sam._sampling import read_rdb, read_RV_file, has_extras
+
+
+rdb = """# a comment
+jdb\tvrad\tsvrad\tfwhm\tbis
+---\t----\t-----\t----\t---
+57000.1\t1.5\t0.3\t7.1\t0.01
+57001.2\t-2.5\t0.4\t7.2\t0.02
+# another comment
+57003.3\t0.5\t0.2\t7.0\t0.03
+"""
+
+
+def test_read_rdb(tmp_path):
+	filename = tmp_path / 'star.rdb'
+	filename.write_text(rdb)
+	t, y, e, extras = read_rdb(str(filename))
+	np.testing.assert_allclose(t, [57000.1, 57001.2, 57003.3])
+	np.testing.assert_allclose(y, [1.5, -2.5, 0.5])
+	np.testing.assert_allclose(e, [0.3, 0.4, 0.2])
+	assert sorted(extras) == ['bis', 'fwhm']
+	np.testing.assert_allclose(extras['fwhm'], [7.1, 7.2, 7.0])
+	assert has_extras(str(filename))
+	assert len(read_RV_file(str(filename))) == 3
+
+
+def test_read_plain_and_bad_lines(tmp_path):
+	filename = tmp_path / 'star.txt'
+	filename.write_text("1 2 3\n4 5 nope\n7 8 9\n")
+	t, y, e, extras = read_rdb(str(filename))
+	np.testing.assert_allclose(t, [1, 7])
+	assert extras == {}
+	assert not has_extras(str(filename))
+
+
+def test_from_file_and_directory(tmp_path):
+	for i in range(5):
+		(tmp_path / ('star%d.rdb' % i)).write_text(rdb)
+	sampling = TimeSampling.from_file(str(tmp_path / 'star0.rdb'))
+	assert sampling.nobs == 3
+	np.testing.assert_allclose(sampling.vrad, [1.5, -2.5, 0.5])
+
+	samplings = TimeSampling.from_directory(str(tmp_path), max_workers=2)
+	assert len(samplings) == 5
+	for s in samplings.values():
+		np.testing.assert_allclose(s.get_times(), sampling.get_times())
+
+
+def test_generate_schedules():
+	from sam._sampling import generate_schedules
+	times = generate_schedules(200, nobs=20, duration=500., start=57000.,
+	                           season=0.5, weather=0.3, min_spacing=3, rng=1)
+	assert times.shape == (200, 20)
+	nights = np.round(times - 57000.)
+	assert (np.diff(nights, axis=1) >= 3).all()
+	assert ((nights % 365.25) < 0.5 * 365.25).all()
+	assert nights.min() >= 0 and nights.max() < 500
+	# different schedules
+	assert not (times[0] == times[1]).all()
+	with pytest.raises(ValueError):
+		generate_schedules(2, nobs=100, duration=200., min_spacing=3)
+	with pytest.raises(ValueError):
+		generate_schedules(2, nobs=10, duration=200., min_spacing=0)
+
+
+def test_gaps_and_coverage():
+	from sam._sampling import schedule_gaps, schedule_coverage
+	t = np.r_[np.arange(10.), np.arange(100., 110.)]
+	np.testing.assert_allclose(schedule_gaps(t), 91 / 109)
+	assert TimeSampling(t).gaps == pytest.approx(100 * 91 / 109)
+	np.testing.assert_allclose(schedule_coverage(t), 20 / 110)
+	np.testing.assert_allclose(schedule_coverage(np.arange(10.)), 1.)
+	# vectorized over schedules
+	assert schedule_gaps(np.vstack([t, t[::-1]])).shape == (2,)
+
+
+def test_random_sampling():
+	sampling = TimeSampling(nobs=50, duration=100., rng=3)
+	assert sampling.nobs == 50
+	assert sampling.duration <= 100.
+	assert len(TimeSampling.generate(4, nobs=10)) == 4
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from sam import utils
+
+
+def test_lru_cache():
+	cache = utils.LRUCache(maxsize=2)
+	cache['a'], cache['b'] = 1, 2
+	cache['a']
+	cache['c'] = 3
+	assert 'b' not in cache
+	assert len(cache) == 2 and cache.get('a') == 1
+
+	# bounded by the size of the arrays too
+	cache = utils.LRUCache(maxsize=4, maxbytes=200)
+	cache['a'], cache['b'] = np.zeros(10), (np.zeros(10), np.zeros(5))
+	cache['c'] = np.zeros(10)
+	assert 'a' not in cache and cache.nbytes == 200
+	cache['d'] = np.zeros(30)  # too large to keep
+	assert 'd' not in cache and len(cache) == 2
+
+
+def test_frequency_grid_cached():
+	t = np.sort(np.random.uniform(0, 50, 100))
+	key1, nu1 = utils.frequency_grid(t)
+	key2, nu2 = utils.frequency_grid(t.copy())
+	assert key1 == key2 and nu1 is nu2
+	key3, _ = utils.frequency_grid(t + 1e-3)
+	assert key3 != key1
+
+
+def test_interpolated_timeseries():
+	from sam.utils import interpolation_grid, timeseries_from_psd_interpolated
+	t = np.sort(np.random.default_rng(1).uniform(0, 50, 40))
+	nu = interpolation_grid(t, 1., max_size=1000)
+	assert nu.size == 1001 and nu[0] == 0
+	assert nu[1] == pytest.approx(1 / (2 * np.ptp(t) * 86400))
+	power = np.full(nu.size, 2.)
+	y = timeseries_from_psd_interpolated(nu, power, t, 2000, 
+	                                     np.random.default_rng(2), 
+	                                     missing_variance=1.)
+	assert y.shape == (2000, t.size)
+	variance = 2. * nu[-1] + 2. * nu[1] / 2 + 1.
+	assert y.var() == pytest.approx(variance, rel=0.05)